@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from statsmodels.tsa import stattools
+from statsmodels.regression.linear_model import OLS
+import _math
+
+
+
+def _series(shared, metric, cat):
+	#the (metric, time, category) array is memory-mapped once per process
+	if "data" not in shared:
+		shared["data"] = np.load(shared["path"], mmap_mode="r")
+	return np.asarray(shared["data"][metric, :, cat], dtype=float)
+
+
+
+def _runPair(task, shared):
+	"""
+	Runs the cointegration and both Granger tests of the (indep, dep, cat)
+	pair of metrics on the memory-mapped data.
+	"""
+	indep, dep, cat = task
+	maxLag = shared["maxLag"]
+	x = _series(shared, indep, cat)
+	y = _series(shared, dep, cat)
+
+	#cointegration: ADF on the residuals of dep regressed on indep
+	resid = OLS(y, x).fit().resid
+	cointStat, cointPval = stattools.adfuller(resid)[:2]
+
+	#granger tests in both directions at the fewer lags of both criteria
+	lagDep = min(_math.selectOrder(y, maxLag))
+	lagIndep = min(_math.selectOrder(x, maxLag))
+	indepOntoDep = _math.granger(y, x, lagDep).iloc[-1]
+	depOntoIndep = _math.granger(x, y, lagIndep).iloc[-1]
+	return {"coint_stat": cointStat, "coint_pval": cointPval,
+		"lag_dep": lagDep, "F_indep_dep": indepOntoDep["F"], "pval_indep_dep": indepOntoDep["F_pvalue"],
+		"lag_indep": lagIndep, "F_dep_indep": depOntoIndep["F"], "pval_dep_indep": depOntoIndep["F_pvalue"]}
+
+
+
+def runBattery(metrics, pairs, maxLag, workers=None):
+	"""
+	Runs the full test battery (ADF and seasonality of each series, and
+	cointegration and Granger tests both ways of each pair) on every category
+	of every metric. metrics maps each metric name to a (date x category)
+	DataFrame, all on the same index and columns, and pairs lists the
+	(indep, dep) metric names to test.
+
+	The metrics are stacked into one array saved to a temporary .npy file,
+	which the processes of a pool of `workers` processes (all cores by
+	default) memory-map instead of being sent the frames, with one task per
+	pair. The ADF tests of all series are batched in this process instead.
+
+	Returns one report DataFrame indexed by (category, indep, dep).
+	"""
+	names = list(metrics)
+	first = metrics[names[0]]
+	categories = list(first.columns)
+	data = np.stack([metrics[name].reindex(index=first.index, columns=categories).values.astype(float)
+		for name in names])
+	position = dict((name, i) for i, name in enumerate(names))
+
+	tasks = [(position[indep], position[dep], c) for c in range(len(categories)) for indep, dep in pairs]
+
+	tmp = tempfile.mkdtemp()
+	shared = {"path": os.path.join(tmp, "battery.npy"), "maxLag": maxLag}
+	try:
+		np.save(shared["path"], data)
+		results = _math._runPool(_runPair, tasks, shared, workers)
+	finally:
+		#run in this process, the map must be closed before its file is removed
+		shared.pop("data", None)
+		shutil.rmtree(tmp)
+
+	#the unit root and seasonality tests already run on every series at once
+	adf = _math.adfBatch(data.transpose(0, 2, 1).reshape(-1, data.shape[1])).reshape(data.shape[0], -1)
+	frame = pd.concat([metrics[name].reindex(index=first.index, columns=categories) for name in names],
+		axis=1, keys=names)
+	chi = _math.seasonality(frame)
+
+	rows = []
+	for (indep, dep, c), result in zip(tasks, results):
+		row = {"category": categories[c], "indep": names[indep], "dep": names[dep]}
+		for role, m in [("indep", indep), ("dep", dep)]:
+			row["adf_stat_" + role] = adf[m, c]["stat"]
+			row["adf_pval_" + role] = adf[m, c]["pvalue"]
+			row["chi2_pval_" + role] = chi["pvalue"][(names[m], categories[c])]
+		row.update(result)
+		rows.append(row)
+
+	columns = ["category", "indep", "dep",
+		"adf_stat_indep", "adf_pval_indep", "adf_stat_dep", "adf_pval_dep",
+		"chi2_pval_indep", "chi2_pval_dep", "coint_stat", "coint_pval",
+		"lag_dep", "F_indep_dep", "pval_indep_dep", "lag_indep", "F_dep_indep", "pval_dep_indep"]
+	return pd.DataFrame(rows, columns=columns).set_index(["category", "indep", "dep"])
@@ -0,0 +1,157 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import _instrument
+
+#directory in which loaded series are cached, or None to disable caching
+CACHE_DIR = ".cache"
+
+
+
+def categoryCounts(users, cats, categories=None):
+	"""
+	Counts the number of rows (people) of each category on each date.
+
+	users is a Series of user IDs indexed by date, and cats a Series mapping
+	user ID to category. IDs missing from cats are given category 0, which is
+	left out unless it is asked for in categories. By default every other
+	category found is counted.
+
+	The categories, which may be any labels, are factorized into integer
+	codes, attached with one hash join (Series.map) and counted with one
+	groupby, giving a (date x category) DataFrame.
+	"""
+	codes, labels = pd.factorize(cats)
+	code = users.map(pd.Series(codes, index=cats.index)).fillna(-1).astype(int)
+	counts = users.groupby([users.index, code.values]).size().unstack(fill_value=0)
+	#code -1 (no category, or a missing one in cats) is category 0
+	counts.columns = [0 if c == -1 else labels[c] for c in counts.columns]
+	if categories is None:
+		categories = sorted(c for c in counts.columns if c != 0)
+	return counts.reindex(columns=categories, fill_value=0)
+
+
+
+def _sourceKey(path):
+	stat = os.stat(path)
+	return [os.path.abspath(path), stat.st_mtime, stat.st_size]
+
+
+
+def cached(name, sources, params, build, cacheDir=None):
+	"""
+	Returns the Series or DataFrame (with a DatetimeIndex) made by build(),
+	caching it in cacheDir (CACHE_DIR by default) keyed by the name, the
+	modification time and size of every source file, and params.
+
+	Values and index are stored as .npy files, so a cached frame is read back
+	by memory-mapping its values without parsing any CSV.
+	"""
+	cacheDir = CACHE_DIR if cacheDir is None else cacheDir
+	if not cacheDir:
+		return build()
+	key = repr([name, [_sourceKey(path) for path in sources], params])
+	base = os.path.join(cacheDir, name + "-" + hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+	if os.path.exists(base + ".json"):
+		with open(base + ".json") as f:
+			meta = json.load(f)
+		values = np.load(base + ".values.npy", mmap_mode="r")
+		index = pd.DatetimeIndex(np.load(base + ".index.npy"), name=meta["index"])
+		if meta["series"]:
+			return pd.Series(values, index=index, name=meta["columns"][0], copy=False)
+		return pd.DataFrame(values, index=index, columns=meta["columns"], copy=False)
+
+	frame = build()
+	if not os.path.isdir(cacheDir):
+		os.makedirs(cacheDir)
+	series = isinstance(frame, pd.Series)
+	columns = [frame.name] if series else frame.columns
+	meta = {"series": series, "index": frame.index.name,
+		"columns": [c.item() if hasattr(c, "item") else c for c in columns]}
+	np.save(base + ".values.npy", np.ascontiguousarray(frame.values))
+	np.save(base + ".index.npy", np.asarray(pd.DatetimeIndex(frame.index)))
+	#the metadata marks the entry complete, so it is written last
+	with open(base + ".json.tmp", "w") as f:
+		json.dump(meta, f)
+	os.rename(base + ".json.tmp", base + ".json")
+	return frame
+
+
+
+@_instrument.timed()
+def loadDaily(path, column, start, end, header=0, fill="ffill"):
+	"""
+	Reads column of a daily CSV indexed by date, reindexes it to every day
+	from start to end and fills the missing days, either by carrying the last
+	value forward (fill="ffill") or with the value fill. The result is cached.
+	"""
+	def build():
+		frame = pd.read_csv(path, header=header, index_col=0, parse_dates=True)
+		newIndex = pd.date_range(start=start, end=end).rename("Date")
+		series = frame[column].reindex(newIndex)
+		return series.ffill() if fill == "ffill" else series.fillna(fill)
+	return cached("daily", [path], [column, str(start), str(end), header, fill], build)
+
+
+
+@_instrument.timed()
+def loadCategoryCounts(path, cats, categories=None, chunksize=None):
+	"""
+	Reads a per-user daily CSV (no header, rows of date, user ID) and returns
+	the categoryCounts of its rows. The result is cached.
+
+	With chunksize set, the file is streamed that many rows at a time and
+	each chunk's counts are added into the running (date x category) matrix,
+	so memory is bounded by the chunk plus the output instead of the file.
+	"""
+	catsKey = hashlib.sha1(pd.util.hash_pandas_object(cats).values.tobytes()).hexdigest()
+	return cached("categories", [path], [catsKey, categories],
+		lambda: _loadCategoryCounts(path, cats, categories, chunksize))
+
+
+
+def _loadCategoryCounts(path, cats, categories, chunksize):
+	reader = pd.read_csv(path, header=None, index_col=0, parse_dates=True, chunksize=chunksize)
+	if chunksize is None:
+		return categoryCounts(reader[1], cats, categories)
+
+	counts = None
+	for chunk in reader:
+		chunkCounts = categoryCounts(chunk[1], cats, categories)
+		counts = chunkCounts if counts is None else counts.add(chunkCounts, fill_value=0)
+	if counts is None:
+		return pd.DataFrame(columns=categories)
+	if categories is None:
+		categories = sorted(counts.columns)
+	return counts.reindex(columns=categories, fill_value=0).astype(int)
+
+
+
+@_instrument.timed()
+def resample(data, days=7, rule=None):
+	"""
+	Sums daily data into buckets of `days` consecutive days, labelled by the
+	first day of each bucket. A partial trailing bucket is summed over the
+	days it has. data may be a Series or a DataFrame with one series per
+	column, and all of them are summed with a single reshape.
+
+	With rule set (e.g. "W" or "MS"), the data is instead summed into pandas
+	calendar periods, which requires a DatetimeIndex.
+	"""
+	if rule is not None:
+		return data.resample(rule).sum()
+
+	values = np.asarray(data.values)
+	n = values.shape[0]
+	buckets = -(-n // days)
+	padding = np.zeros((buckets*days - n,) + values.shape[1:], dtype=values.dtype)
+	blocks = np.concatenate([values, padding]).reshape((buckets, days) + values.shape[1:])
+	sums = np.nansum(blocks, axis=1)
+
+	index = data.index[::days]
+	if isinstance(data, pd.Series):
+		return pd.Series(sums, index=index, name=data.name)
+	return pd.DataFrame(sums, index=index, columns=data.columns)
@@ -0,0 +1,304 @@
+import os
+import sys
+import csv
+import json
+import time
+import atexit
+import cProfile
+import datetime
+import threading
+import functools
+import tracemalloc
+try:
+	import resource
+except ImportError:
+	resource = None
+
+"""
+Stage level timing and memory instrumentation of the scripts.
+
+Stages are timed with the stage context manager, the timed decorator, or
+step, which ends the script's previous step and starts the next one:
+
+	_instrument.step("load data")
+	...
+	_instrument.step("granger")
+
+For every stage the report records the wall time, the CPU time of the
+process and of the process pools it ran (children_cpu), the process' peak RSS
+after it and how much it grew, the rows the stage produced (len of a timed
+function's result, or as set with rows()) and, if memory tracing is on, the
+net and peak memory allocated by Python during the stage. RSS and traced
+memory are per process, so stages running at once in threads (as _pipeline's
+do) share them.
+
+Everything is off unless enabled, by calling enable() or by setting the
+environment variables:
+
+	INSTRUMENT          report file prefix (or 1 for "instrument"); the
+	                    report is written to prefix.json and prefix.csv
+	                    when the script exits
+	INSTRUMENT_MEMORY   1 to trace allocations with tracemalloc, which
+	                    slows Python allocations down noticeably
+	INSTRUMENT_PROFILE  comma separated stages to run under cProfile (* for
+	                    all), each written to prefix-<stage>.prof. Every
+	                    thread has its own profiler, so stages running on
+	                    _pipeline's threads get their own profiles, while a
+	                    stage nested in a profiled stage of the same thread
+	                    is part of that stage's profile
+
+When disabled, stage, step and timed functions cost one flag check.
+"""
+
+_enabled = False
+_memory = False
+_profile = set()
+_prefix = "instrument"
+_started = None
+_records = []
+_lock = threading.Lock()
+_local = threading.local()
+_step = None
+#profile files written so far, so repeated stages get numbered files
+_profiles = set()
+
+
+
+def _makeDirs(path):
+	directory = os.path.dirname(path)
+	if directory and not os.path.isdir(directory):
+		os.makedirs(directory)
+
+
+
+def _childrenCPU():
+	#CPU time of the ended child processes, such as those of _math's pools
+	times = os.times()
+	return times[2] + times[3]
+
+
+
+def _maxRSS():
+	#peak resident set size of the process so far, in MB
+	if resource is None:
+		return float("nan")
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return peak / (1024.0*1024.0) if sys.platform == "darwin" else peak / 1024.0
+
+
+
+def _profileName(path):
+	#prefix-<stage path>.prof, numbered from the second run of a stage on
+	name = _prefix + "-" + path.replace("/", "-").replace(" ", "_")
+	with _lock:
+		count = 1
+		while name + ("-%d" % count if count > 1 else "") + ".prof" in _profiles:
+			count += 1
+		name += ("-%d" % count if count > 1 else "") + ".prof"
+		_profiles.add(name)
+	return name
+
+
+
+class _Stage(object):
+	"""One timed stage; see stage()."""
+
+	def __init__(self, name):
+		self.name = name
+		self.rows = None
+
+	def __enter__(self):
+		stack = getattr(_local, "stack", None)
+		if stack is None:
+			stack = _local.stack = []
+		self.parent = stack[-1] if stack else None
+		self.path = self.name if self.parent is None else self.parent.path + "/" + self.name
+		stack.append(self)
+
+		#a thread runs one profiler at a time, so stages nested in a profiled
+		#stage of the same thread are part of its profile
+		self.profiler = None
+		self.profile = None
+		if "*" in _profile or self.name in _profile:
+			outer = getattr(_local, "profiled", None)
+			if outer is not None:
+				self.profile = outer.profile
+			else:
+				self.profiler = cProfile.Profile()
+				self.profile = _profileName(self.path)
+				_local.profiled = self
+		self.tracedPeak = 0
+		if _memory:
+			self.traced = tracemalloc.get_traced_memory()[0]
+			tracemalloc.reset_peak()
+		self.rss = _maxRSS()
+		self.start = time.time()
+		self.cpu = time.process_time()
+		self.childrenCPU = _childrenCPU()
+		if self.profiler is not None:
+			self.profiler.enable()
+		return self
+
+	def __exit__(self, *exc):
+		if self.profiler is not None:
+			self.profiler.disable()
+		wall = time.time() - self.start
+		cpu = time.process_time() - self.cpu
+		record = {"stage": self.path, "start": self.start - _started, "wall": wall, "cpu": cpu,
+			"children_cpu": _childrenCPU() - self.childrenCPU,
+			"maxrss_mb": _maxRSS(), "rss_growth_mb": _maxRSS() - self.rss, "rows": self.rows,
+			"traced_mb": None, "traced_peak_mb": None, "profile": self.profile}
+		if _memory:
+			current, peak = tracemalloc.get_traced_memory()
+			#inner stages reset the peak, so they hand theirs up
+			self.tracedPeak = max(self.tracedPeak, peak)
+			record["traced_mb"] = (current - self.traced) / 1e6
+			record["traced_peak_mb"] = (self.tracedPeak - self.traced) / 1e6
+			if self.parent is not None:
+				self.parent.tracedPeak = max(self.parent.tracedPeak, self.tracedPeak)
+			tracemalloc.reset_peak()
+		if self.profiler is not None:
+			_makeDirs(self.profile)
+			self.profiler.dump_stats(self.profile)
+			_local.profiled = None
+		_local.stack.pop()
+		with _lock:
+			_records.append(record)
+		return False
+
+
+
+class _Off(object):
+	#the stage handed out while disabled
+	rows = None
+	def __enter__(self):
+		return self
+	def __exit__(self, *exc):
+		return False
+
+_OFF = _Off()
+
+
+
+def stage(name):
+	"""
+	Context manager timing the block as the stage name (nested stages are
+	named parent/name). Set .rows on the object it returns to record the
+	number of rows the stage produced.
+	"""
+	return _Stage(name) if _enabled else _OFF
+
+
+
+def timed(name=None):
+	"""
+	Decorator timing every call of a function as a stage (named after the
+	function by default), recording len() of its result as the rows.
+	"""
+	def decorate(func):
+		stageName = name or func.__name__
+		@functools.wraps(func)
+		def wrapper(*args, **kwargs):
+			if not _enabled:
+				return func(*args, **kwargs)
+			with _Stage(stageName) as s:
+				result = func(*args, **kwargs)
+				try:
+					s.rows = len(result)
+				except TypeError:
+					pass
+				return result
+		return wrapper
+	return decorate
+
+
+
+def step(name):
+	"""
+	Ends the current step of a script (if any) and starts the step name,
+	or only ends it if name is None.
+	"""
+	global _step
+	if not _enabled:
+		return
+	if _step is not None:
+		_step.__exit__(None, None, None)
+		_step = None
+	if name is not None:
+		_step = _Stage(name).__enter__()
+
+
+
+def rows(count):
+	"""Records count as the rows produced by the innermost open stage."""
+	stack = getattr(_local, "stack", None)
+	if _enabled and stack:
+		stack[-1].rows = int(count)
+
+
+
+def enable(prefix=None, memory=False, profile=()):
+	"""
+	Turns instrumentation on, writing the report to prefix.json and
+	prefix.csv at exit. memory traces allocations with tracemalloc, and
+	profile names the stages to run under cProfile ("*" for all).
+	"""
+	global _enabled, _memory, _profile, _prefix, _started
+	if prefix:
+		_prefix = prefix
+	_memory = memory
+	_profile = set(profile)
+	if memory and not tracemalloc.is_tracing():
+		tracemalloc.start()
+	if not _enabled:
+		_started = time.time()
+		atexit.register(report)
+	_enabled = True
+
+
+
+def disable():
+	"""Turns instrumentation off, ending the current step."""
+	global _enabled
+	step(None)
+	_enabled = False
+	if _memory and tracemalloc.is_tracing():
+		tracemalloc.stop()
+
+
+
+def records():
+	"""Returns the records of every stage ended so far, in order of ending."""
+	with _lock:
+		return list(_records)
+
+
+
+def report(prefix=None):
+	"""
+	Ends the current step and writes the run's records, in order of starting,
+	to prefix.json (with the command line, start time and total time) and
+	prefix.csv.
+	"""
+	prefix = prefix or _prefix
+	step(None)
+	if _started is None:
+		return
+	rows = sorted(records(), key=lambda record: record["start"])
+	run = {"argv": sys.argv, "started": datetime.datetime.fromtimestamp(_started).isoformat(),
+		"total": time.time() - _started, "maxrss_mb": _maxRSS(), "stages": rows}
+	_makeDirs(prefix)
+	with open(prefix + ".json", "w") as f:
+		json.dump(run, f, indent=1)
+	with open(prefix + ".csv", "w") as f:
+		writer = csv.DictWriter(f, ["stage", "start", "wall", "cpu", "children_cpu", "maxrss_mb", "rss_growth_mb",
+			"rows", "traced_mb", "traced_peak_mb", "profile"])
+		writer.writeheader()
+		writer.writerows(rows)
+
+
+
+if os.environ.get("INSTRUMENT", "0") not in ("", "0"):
+	enable(None if os.environ["INSTRUMENT"] == "1" else os.environ["INSTRUMENT"],
+		os.environ.get("INSTRUMENT_MEMORY", "0") not in ("", "0"),
+		[name.strip() for name in os.environ.get("INSTRUMENT_PROFILE", "").split(",") if name.strip()])
@@ -1,7 +1,78 @@
+import hashlib
+import functools
+import threading
+import multiprocessing
 import scipy
+import scipy.stats
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 import pandas
-from statsmodels.tsa.stattools import acf, adfuller
+from numpy.lib.stride_tricks import as_strided
+from statsmodels.tsa.stattools import adfuller
+from statsmodels.tsa import adfvalues
+
+
+
+def _lagProducts(a, b, maxLag):
+	"""
+	Returns the lagged cross products sum(a[t] * b[t+lag]) for every lag
+	from 0 up to and including maxLag, computed along the last axis with a
+	single FFT. Leading axes are treated as a batch.
+	"""
+	n = a.shape[-1]
+	size = 1
+	while size < n + maxLag:
+		size *= 2
+	fa = np.fft.rfft(a, size, axis=-1)
+	fb = np.fft.rfft(b, size, axis=-1)
+	return np.fft.irfft(np.conj(fa) * fb, size, axis=-1)[..., :maxLag+1]
+
+
+
+def crossCorr(tsY, tsX, maxLag):
+	"""
+	Vectorized version of cc_ols. Calculates the Pearson correlation between
+	the lagged X time series and the Y time series for every lag from 0 up to
+	and including maxLag at once.
+
+	Accepts lists, Series or arrays. When given 2-D arrays, each row is
+	treated as a separate (tsY, tsX) pair and a (rows, maxLag+1) array is
+	returned; rows of one argument may also be broadcast against the other.
+
+	As in cc_ols, the lag is performed on the tsX series, and each lag is
+	normalized only over the overlapping part of both series.
+	"""
+	tsY = np.asarray(tsY, dtype=float)
+	tsX = np.asarray(tsX, dtype=float)
+	tsY, tsX = np.broadcast_arrays(tsY, tsX)
+	n = tsY.shape[-1]
+	if maxLag >= n - 1:
+		raise ValueError("maxLag must be smaller than the series length minus one")
+
+	#correlation is shift invariant, so center first to limit cancellation
+	tsY = tsY - tsY.mean(axis=-1)[..., None]
+	tsX = tsX - tsX.mean(axis=-1)[..., None]
+
+	lags = np.arange(maxLag+1)
+	m = n - lags
+	sxy = _lagProducts(tsX, tsY, maxLag)
+
+	#x uses its first n-lag values, y its last n-lag values
+	zero = np.zeros(tsX.shape[:-1] + (1,))
+	cx = np.concatenate([zero, np.cumsum(tsX, axis=-1)], axis=-1)
+	cxx = np.concatenate([zero, np.cumsum(tsX**2, axis=-1)], axis=-1)
+	cy = np.concatenate([zero, np.cumsum(tsY, axis=-1)], axis=-1)
+	cyy = np.concatenate([zero, np.cumsum(tsY**2, axis=-1)], axis=-1)
+	sx = cx[..., m]
+	sxx = cxx[..., m]
+	sy = cy[..., n:n+1] - cy[..., lags]
+	syy = cyy[..., n:n+1] - cyy[..., lags]
+
+	with np.errstate(divide="ignore", invalid="ignore"):
+		cov = m*sxy - sx*sy
+		varX = np.maximum(m*sxx - sx**2, 0.0)
+		varY = np.maximum(m*syy - sy**2, 0.0)
+		return cov / np.sqrt(varX*varY)
 
 
 
@@ -10,30 +81,74 @@ def cc_ols(tsY, tsX, maxLag):
 	Calculates and returns the correlation between the X time series
 	and Y time series, up to and including max lag.
 
-	Returns list of R's, in pairs of (lag, R).
+	Returns list of R's, one per lag starting at lag 0.
 	The lag is performed on the tsX series, to determine if lagged values
 	of the tsX series have effect upon the tsY series.
 	"""
-	coeffs = []
+	return crossCorr(tsY, tsX, maxLag).tolist()
 
-	tsY = tsY.tolist()
-	tsX = tsX.tolist()
 
-	#lag=0 (i.e. R=1)
-	Rcoeff = scipy.stats.stats.pearsonr(tsX, tsY)[0]
-	coeffs.append(Rcoeff)
 
-	#other lags
-	for lag in range(1, maxLag+1):
-		ts = tsY[lag:]
-		lagts = tsX[:-lag]
-		Rcoeff = scipy.stats.stats.pearsonr(lagts, ts)[0]
-		coeffs.append(Rcoeff)
-	return coeffs
 
 
+def lagView(x, nlags):
+	"""
+	Returns a read-only strided view of x with one row per time t from nlags
+	onwards and nlags+1 columns holding x[t], x[t-1], ..., x[t-nlags].
+	Nothing is copied (apart from converting x to a float array once).
+	If x is 2-D, each row is a series and the view gains a leading axis.
+	"""
+	x = np.ascontiguousarray(x, dtype=float)
+	n = x.shape[-1]
+	if nlags >= n:
+		raise ValueError("nlags must be smaller than the series length")
+	step = x.strides[-1]
+	shape = x.shape[:-1] + (n-nlags, nlags+1)
+	strides = x.strides[:-1] + (step, -step)
+	view = as_strided(x[..., nlags:], shape=shape, strides=strides)
+	view.flags.writeable = False
+	return view
+
 
 
+def lagMatrix(endog, exog=None, endogLags=1, exogLags=None, constant=False, maxLag=None):
+	"""
+	Builds the lagged regression design for endog, returning (y, X).
+
+	y holds endog[t], and X holds (in this order) an optional constant column,
+	endog[t-1..t-endogLags] and, for each exog series (a 1-D series or one per
+	row of a 2-D array), exog[t-1..t-exogLags]. Rows start at t = maxLag,
+	which defaults to the largest lag used, so every model built with the
+	same maxLag shares one sample.
+
+	Lags come from read-only lagView views. When the design is a single block
+	of endog lags without a constant, X is itself a view; otherwise the blocks
+	are copied once into the final matrix.
+	"""
+	exogLags = endogLags if exogLags is None else exogLags
+	if maxLag is None:
+		maxLag = max(endogLags, exogLags if exog is not None else 0)
+	if maxLag < max(endogLags, exogLags if exog is not None else 0):
+		raise ValueError("maxLag must be at least as large as the lags requested")
+
+	view = lagView(endog, maxLag)
+	y = view[:, 0]
+	blocks = [view[:, 1:endogLags+1]]
+	if exog is not None:
+		exog = np.atleast_2d(np.asarray(exog, dtype=float))
+		for series in lagView(exog, maxLag):
+			blocks.append(series[:, 1:exogLags+1])
+	if constant:
+		blocks.insert(0, np.ones((y.shape[0], 1)))
+
+	if len(blocks) == 1:
+		return y, blocks[0]
+	return y, np.hstack(blocks)
+
+
+
+#layout of the rows returned by ljungBox, as consumed by tabulate
+LJUNG_BOX_DTYPE = np.dtype([("lag", int), ("R", float), ("Q", float), ("p", float)])
 
 def ljungBox(ACF, n, maxLag):
 	"""
@@ -43,27 +158,617 @@ def ljungBox(ACF, n, maxLag):
 	A high Q indicates that at the given lag, the independent variable is
 	good at predicting the dependent variable. A low Q is the opposite
 	(little help in prediction).
+
+	Returns a structured array of (lag, R, Q, p) rows for lags 0..maxLag.
+	ACF may also be a 2-D array with one ACF/PACF/CCF per row (n is then a
+	scalar or one length per row), in which case one row of results is
+	returned per series.
+	"""
+	ACF = np.asarray(ACF, dtype=float)
+	single = ACF.ndim == 1
+	ACF = np.atleast_2d(ACF)[:, :maxLag+1]
+	n = np.asarray(n, dtype=float).reshape(-1, 1)
+	lags = np.arange(maxLag+1)
+
+	#Q at each lag is the running sum of R^2/(n-k) for k=1..lag
+	frac = np.zeros(ACF.shape)
+	frac[:, 1:] = np.cumsum(ACF[:, 1:]**2 / (n - lags[1:]), axis=1)
+	Q = frac*n*(n+2)
+	with np.errstate(invalid="ignore"):
+		pval = np.where(Q == 0, 1.0, scipy.stats.chi2.sf(Q, lags))
+
+	coeffs = np.empty(ACF.shape, dtype=LJUNG_BOX_DTYPE)
+	coeffs["lag"] = lags
+	coeffs["R"] = ACF
+	coeffs["Q"] = Q
+	coeffs["p"] = pval
+	return coeffs[0] if single else coeffs
+
+def acfBatch(X, maxLag):
+	"""
+	Calculates the (biased, normalized by nobs) autocorrelation function of
+	every row of X up to and including maxLag in a single FFT pass.
+	Returns an array of shape (rows, maxLag+1), or a 1-D array for 1-D input.
+	"""
+	X = np.asarray(X, dtype=float)
+	X = X - X.mean(axis=-1)[..., None]
+	acov = _lagProducts(X, X, maxLag)
+	with np.errstate(divide="ignore", invalid="ignore"):
+		return acov / acov[..., :1]
+
+
+
+def pacfBatch(ACF):
+	"""
+	Calculates the partial autocorrelation function from each row of ACF with
+	the Levinson-Durbin recursion, vectorized across rows. Given the output
+	of acfBatch this matches statsmodels' pacf(method="ldb").
+	"""
+	ACF = np.asarray(ACF, dtype=float)
+	maxLag = ACF.shape[-1] - 1
+	PACF = np.ones(ACF.shape)
+	phi = np.zeros(ACF.shape[:-1] + (0,))
+	for k in range(1, maxLag+1):
+		num = ACF[..., k] - (phi * ACF[..., k-1:0:-1]).sum(axis=-1)
+		den = 1.0 - (phi * ACF[..., 1:k]).sum(axis=-1)
+		with np.errstate(divide="ignore", invalid="ignore"):
+			phikk = num / den
+		phi = np.concatenate([phi - phikk[..., None]*phi[..., ::-1], phikk[..., None]], axis=-1)
+		PACF[..., k] = phikk
+	return PACF
+
+
+
+def ljungBoxBatch(X, maxLag, statistic="acf"):
+	"""
+	Runs the Ljung-Box test on every row of X (one raw series per row) for
+	lags 0..maxLag, returning the same structured (lag, R, Q, p) rows as
+	ljungBox, with one row of results per series.
+
+	statistic selects which correlations enter Q:
+	"acf"  - the autocorrelations, i.e. the standard Ljung-Box test as in
+	         ljungBox2 and statsmodels' acorr_ljungbox.
+	"pacf" - the partial autocorrelations, as when the scripts pass a PACF
+	         to ljungBox. The PACF is taken from the same ACF by
+	         Levinson-Durbin (Yule-Walker), not by pacf_ols, so values
+	         differ slightly from the scripts' pacf_ols based numbers.
 	"""
-	coeffs = [[i, val] for i,val in enumerate(ACF)]
+	X = np.asarray(X, dtype=float)
+	R = acfBatch(X, maxLag)
+	if statistic == "pacf":
+		R = pacfBatch(R)
+	elif statistic != "acf":
+		raise ValueError("statistic must be 'acf' or 'pacf'")
+	return ljungBox(R, X.shape[-1], maxLag)
 
-	for lag in range(0, maxLag+1):
-		frac = 0.0
-		for k in range(1, lag+1):
-			frac += (coeffs[k][1]**2 / (n-k))
-		Q = frac*n*(n+2)
-		pval =  1.0 if Q == 0 else scipy.stats.chi2.sf(Q, lag)
-		coeffs[lag].append(Q)
-		coeffs[lag].append(pval)
 
-	return coeffs
 
 def ljungBox2(x, maxlag):
-	lags = np.asarray(range(1, maxlag+1))
-	x = x.tolist()
-	n = len(x)
-	acfx = acf(x, nlags=maxlag) # normalize by nobs not (nobs-nlags)
-	acf2norm = acfx[1:maxlag+1]**2 / (n - np.arange(1,maxlag+1))
-
-	qljungbox = n * (n+2) * np.cumsum(acf2norm)[lags-1]
-	pval = scipy.stats.chi2.sf(qljungbox, lags)
-	return qljungbox, pval
\ No newline at end of file
+	"""
+	Standard Ljung-Box test on the raw series x (ACF based), returning the
+	Q statistics and p-values for lags 1..maxlag.
+	"""
+	results = ljungBoxBatch(np.asarray(x, dtype=float), maxlag, statistic="acf")
+	return results["Q"][1:], results["p"][1:]
+
+
+
+def _subsetRSS(R, cols):
+	"""
+	Residual sum of squares from regressing the last column of a matrix Z on
+	the columns cols of Z, given only the R factor of Z's QR decomposition,
+	or NaN if those columns are (next to) linearly dependent, e.g. a series
+	of zeros or a constant one besides the constant column.
+	"""
+	sub = np.linalg.qr(R[:, list(cols) + [R.shape[1]-1]], mode="r")
+	#what is left of each column after the ones before it, relative to its norm
+	norms = np.sqrt((R[:, cols]**2).sum(axis=0))
+	if (np.abs(np.diag(sub)[:-1]) <= norms * np.sqrt(np.finfo(float).eps)).any():
+		return np.nan
+	return sub[-1, -1]**2
+
+
+
+def granger(endog, exog, maxLag, commonSample=True):
+	"""
+	Tests whether exog Granger causes endog for every lag order from 1 up to
+	and including maxLag, without printing anything.
+
+	Both the restricted (constant and endog lags) and unrestricted (plus exog
+	lags) models of every order are nested in the maxLag design, so that
+	design is QR factorized once and each model's residual sum of squares is
+	read from a small QR of the columns of R it uses.
+
+	By default every order is fitted on the same sample, starting at
+	t = maxLag. With commonSample=False each order uses all available
+	observations instead (one factorization per order), which matches
+	statsmodels' grangercausalitytests exactly.
+
+	The unrestricted model of maxLag must leave residual degrees of freedom,
+	so maxLag can be at most (len(endog) - 2) // 3. Orders whose restricted
+	or unrestricted design is rank deficient (e.g. an exog of zeros) cannot
+	be tested and get NaN statistics, where grangercausalitytests raises.
+
+	Returns a DataFrame indexed by lag with the F, chi2 and likelihood ratio
+	statistics and their p-values, as in grangercausalitytests.
+	"""
+	endog = np.asarray(endog, dtype=float)
+	exog = np.asarray(exog, dtype=float)
+	if len(endog) - 3*maxLag - 1 <= 0:
+		raise ValueError("maxLag must be at most (len(endog) - 2) // 3 = %d" % ((len(endog) - 2) // 3))
+	lags = np.arange(1, maxLag+1)
+	rssR = np.empty(maxLag)
+	rssU = np.empty(maxLag)
+	nobs = np.empty(maxLag)
+
+	for lag in lags:
+		if lag == 1 or not commonSample:
+			top = maxLag if commonSample else lag
+			y, X = lagMatrix(endog, exog, endogLags=top, exogLags=top, constant=True)
+			R = np.linalg.qr(np.column_stack([X, y]), mode="r")
+		restricted = list(range(lag+1))
+		unrestricted = restricted + list(range(top+1, top+lag+1))
+		rssR[lag-1] = _subsetRSS(R, restricted)
+		rssU[lag-1] = _subsetRSS(R, unrestricted)
+		nobs[lag-1] = y.shape[0]
+
+	return _grangerTable(rssR, rssU, nobs, lags)
+
+
+
+def _grangerTable(rssR, rssU, nobs, lags):
+	"""
+	Builds granger's results table from the residual sums of squares of the
+	restricted and unrestricted model of each lag order.
+	"""
+	dfDenom = nobs - 2*lags - 1
+	F = (rssR - rssU) / lags / (rssU / dfDenom)
+	chi2 = nobs * (rssR - rssU) / rssU
+	lr = nobs * np.log(rssR / rssU)
+	return pandas.DataFrame({
+		"F": F,
+		"F_pvalue": scipy.stats.f.sf(F, lags, dfDenom),
+		"df_num": lags,
+		"df_denom": dfDenom,
+		"chi2": chi2,
+		"chi2_pvalue": scipy.stats.chi2.sf(chi2, lags),
+		"lr": lr,
+		"lr_pvalue": scipy.stats.chi2.sf(lr, lags),
+		"nobs": nobs.astype(int),
+	}, index=pandas.Index(lags, name="lag"), columns=["F", "F_pvalue",
+		"df_num", "df_denom", "chi2", "chi2_pvalue", "lr", "lr_pvalue", "nobs"])
+
+
+
+
+def grangerBatch(endog, exog, lag):
+	"""
+	Tests whether each row of exog Granger causes the same row of endog at
+	the given lag, for many pairs of equally long series at once (e.g. one
+	row per patient). Gives the same F test as granger(endog[i], exog[i], lag)
+	at that lag.
+
+	The lagged designs [constant, endog lags, exog lags, endog] of all rows
+	are stacked into a (rows x time x columns) array and QR factorized in one
+	batched call. The restricted model is a prefix of the unrestricted one,
+	so both residual sums of squares are read off the same R factor. Rows
+	whose unrestricted design is rank deficient (e.g. a series of zeros) or
+	fits endog exactly (e.g. a patient with one event) cannot be tested and
+	get NaN.
+
+	Returns (F, pvalues) arrays with one entry per row.
+	"""
+	endog = np.atleast_2d(np.asarray(endog, dtype=float))
+	exog = np.atleast_2d(np.asarray(exog, dtype=float))
+	endog, exog = np.broadcast_arrays(endog, exog)
+	y = lagView(endog, lag)
+	x = lagView(exog, lag)
+	m = y.shape[1]
+	design = np.concatenate([np.ones(y.shape[:2] + (1,)), y[..., 1:], x[..., 1:], y[..., :1]], axis=-1)
+	R = np.linalg.qr(design, mode="r")
+
+	#residual sums of squares of the prefixes of the columns
+	rss = np.cumsum(R[:, ::-1, -1]**2, axis=1)[:, ::-1]
+	rssR = rss[:, lag+1]
+	rssU = rss[:, 2*lag+1]
+	diag = np.abs(np.diagonal(R[:, :-1, :-1], axis1=1, axis2=2))
+	deficient = (diag <= diag.max(axis=1)[:, None] * m * np.finfo(float).eps).any(axis=1)
+	#an unrestricted model leaving (next to) nothing of endog's variation
+	#unexplained has no error to test against
+	perfect = rssU <= 100*np.sqrt(np.finfo(float).eps) * rss[:, 1]
+
+	dfDenom = m - 2*lag - 1
+	with np.errstate(divide="ignore", invalid="ignore"):
+		F = (rssR - rssU) / lag / (rssU / dfDenom)
+	F[deficient | perfect] = np.nan
+	return F, scipy.stats.f.sf(F, lag, dfDenom)
+
+
+
+#arrays handed to pool workers once, by _runPool, instead of with every task
+_shared = {}
+
+def _initShared(shared):
+	_shared.clear()
+	_shared.update(shared)
+
+def _callShared(worker, task):
+	#runs in a pool process, on the shared data its initializer received
+	return worker(task, _shared)
+
+
+
+def _runPool(worker, tasks, shared, workers=None):
+	"""
+	Maps worker(task, shared) over tasks on a process pool of `workers`
+	processes (all cores by default, but no more than there are tasks). The
+	shared dict of arrays is sent to each process once. With workers=1
+	everything runs in the current process, which is handed shared itself,
+	so concurrent calls from threads do not share any state. So do calls
+	from threads other than the main one (e.g. _pipeline's stages), since
+	forking a process with other threads running can deadlock the children.
+	"""
+	tasks = list(tasks)
+	workers = min(workers or multiprocessing.cpu_count(), len(tasks))
+	if workers <= 1 or threading.current_thread() is not threading.main_thread():
+		return [worker(task, shared) for task in tasks]
+
+	#forking avoids re-running the calling script in every worker
+	methods = multiprocessing.get_all_start_methods()
+	context = multiprocessing.get_context("fork" if "fork" in methods else None)
+	chunksize = max(1, len(tasks) // (4*workers))
+	with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+			initializer=_initShared, initargs=(shared,)) as pool:
+		return list(pool.map(functools.partial(_callShared, worker), tasks, chunksize=chunksize))
+
+
+
+def _grangerColumn(j, shared):
+	"""
+	Granger tests of every series onto series j, on the data in shared.
+	The restricted model (constant and lags of j) is shared by all causes, so
+	it is partialled out of y once, after which each cause only needs its
+	lags' cross products with it and a lag x lag solve (Frisch-Waugh-Lovell).
+	"""
+	views = shared["views"]
+	lags = shared["lags"]
+	gram = shared["gram"]
+	N, m, lag = gram.shape[0], views.shape[1], gram.shape[1]
+
+	restricted = np.column_stack([np.ones(m), views[j, :, 1:]])
+	Q, R = np.linalg.qr(restricted)
+	tol = np.sqrt(np.finfo(float).eps)
+	#an effect whose own lags are (next to) dependent, e.g. a constant
+	#series, cannot be tested against any cause
+	if (np.abs(np.diag(R)) <= np.sqrt((restricted**2).sum(axis=0)) * tol).any():
+		return np.full(N, np.nan), np.full(N, np.nan)
+	y = views[j, :, 0]
+	My = y - Q.dot(Q.T.dot(y))
+	rssR = My.dot(My)
+
+	#cross products of every cause's lags after partialling out the restricted model
+	QtL = Q.T.dot(lags).reshape(-1, N, lag)
+	A = gram - np.einsum("kip,kiq->ipq", QtL, QtL)
+	b = My.dot(lags).reshape(N, lag)
+	#nor can causes with next to nothing left after partialling (e.g. a series
+	#of zeros or a constant one), told apart by the smallest eigenvalue of A
+	#scaled by the lags' own cross products
+	scale = np.sqrt(np.diagonal(gram, axis1=1, axis2=2))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		scaled = A / scale[:, :, None] / scale[:, None, :]
+	singular = ~np.isfinite(scaled).all(axis=(1, 2))
+	singular[j] = True
+	scaled[singular] = np.eye(lag)
+	singular |= np.linalg.eigvalsh(scaled)[:, 0] <= tol
+	A[singular] = np.eye(lag)
+	beta = np.linalg.solve(A, b[..., None])[..., 0]
+	ess = (b * beta).sum(axis=-1)
+	ess[singular] = np.nan
+
+	rssU = rssR - ess
+	dfDenom = m - 2*lag - 1
+	with np.errstate(divide="ignore", invalid="ignore"):
+		F = (ess / lag) / (rssU / dfDenom)
+	return F, scipy.stats.f.sf(F, lag, dfDenom)
+
+
+
+def grangerMatrix(series, lag, workers=None, path=None):
+	"""
+	Runs the Granger causality F test at the given lag for every ordered pair
+	of series, given as a DataFrame (one column per series) or a dict of
+	equally long series.
+
+	Every series' lag matrix and its cross products are built once and
+	shared by all pairs it takes part in, and the restricted model of each
+	effect series is reused for all its causes, so each effect series is
+	tested against every cause at once with batched linear algebra. Effect
+	series are spread over a process pool of `workers` processes.
+
+	Returns (F, pvalues) DataFrames where entry [cause, effect] tests whether
+	cause Granger causes effect; the diagonal and pairs that cannot be tested
+	(a cause or effect of zeros, say) are NaN, as in grangerBatch. If path is
+	given the p-value matrix is also written there as CSV.
+	"""
+	series = pandas.DataFrame(series)
+	names = series.columns
+	views = lagView(series.values.T, lag)
+	#lags of all series side by side, (time, series*lag)
+	lags = np.ascontiguousarray(views[:, :, 1:].transpose(1, 0, 2)).reshape(views.shape[1], -1)
+	gram = np.matmul(views[:, :, 1:].transpose(0, 2, 1), views[:, :, 1:])
+	shared = {"views": views, "lags": lags, "gram": gram}
+	columns = _runPool(_grangerColumn, range(len(names)), shared, workers)
+
+	F = pandas.DataFrame(np.column_stack([c[0] for c in columns]), index=names, columns=names)
+	pvalues = pandas.DataFrame(np.column_stack([c[1] for c in columns]), index=names, columns=names)
+	if path is not None:
+		pvalues.to_csv(path)
+	return F, pvalues
+
+
+
+#selectOrder results, keyed by a fingerprint of the series and maxLag
+_orderCache = {}
+
+def selectOrder(x, maxLag):
+	"""
+	Selects the number of lags of an AR model with a constant for x by both
+	AIC and BIC, returning (aicLag, bicLag).
+
+	Like ar_model.AR(...).fit(maxlag=maxLag, ic=...), every order from 1 to
+	maxLag is fitted by OLS on the same sample (starting at t = maxLag). The
+	models are nested, so their residual sums of squares all come from one QR
+	factorization of the maxLag design. Results are memoized per series, so
+	selecting the order of the same series again is free. The sample must
+	have more observations than the largest model has parameters, so maxLag
+	can be at most (len(x) - 2) // 2.
+	"""
+	x = np.ascontiguousarray(x, dtype=float)
+	if len(x) - maxLag < maxLag + 2:
+		raise ValueError("maxLag must be at most (len(x) - 2) // 2 = %d" % ((len(x) - 2) // 2))
+	key = (hashlib.sha1(x.tobytes()).hexdigest(), maxLag)
+	if key in _orderCache:
+		return _orderCache[key]
+
+	y, X = lagMatrix(x, endogLags=maxLag, constant=True)
+	R = np.linalg.qr(np.column_stack([X, y]), mode="r")
+	#residual sum of squares of each order is what its columns leave unexplained
+	rss = np.cumsum(R[::-1, -1]**2)[::-1][2:]
+	m = y.shape[0]
+	lags = np.arange(1, maxLag+1)
+	params = lags + 2.0
+	aic = np.log(rss/m) + 2*params/m
+	bic = np.log(rss/m) + params*np.log(m)/m
+
+	orders = (int(lags[np.argmin(aic)]), int(lags[np.argmin(bic)]))
+	_orderCache[key] = orders
+	return orders
+
+
+
+def mackinnonp(stat, regression="c", N=1):
+	"""
+	Vectorized adfvalues.mackinnonp: MacKinnon's approximate p-value of every
+	unit root (N=1) or cointegration (N series) test statistic in stat, read
+	from the same tables. NaN statistics give NaN p-values.
+	"""
+	stat = np.asarray(stat, dtype=float)
+	with np.errstate(invalid="ignore"):
+		small = np.polyval(adfvalues._tau_smallps[regression][N-1][::-1], stat)
+		large = np.polyval(adfvalues._tau_largeps[regression][N-1][::-1], stat)
+		pvalue = scipy.stats.norm.cdf(np.where(stat <= adfvalues._tau_stars[regression][N-1], small, large))
+		pvalue = np.where(stat > adfvalues._tau_maxs[regression][N-1], 1.0, pvalue)
+		pvalue = np.where(stat < adfvalues._tau_mins[regression][N-1], 0.0, pvalue)
+	return pvalue
+
+
+
+#layout of the rows returned by adfBatch
+ADF_DTYPE = np.dtype([("stat", float), ("pvalue", float), ("lag", int), ("nobs", int), ("icbest", float)])
+
+def _adfDesign(X, lags, regression):
+	"""
+	Builds the ADF regression with `lags` lagged differences for every row
+	of X at once, returning the differences y (rows, m) and the stacked
+	designs (rows, m, columns) with columns [trend terms, level, lags].
+	"""
+	view = lagView(np.diff(X, axis=-1), lags)
+	m = view.shape[-2]
+	t = np.arange(1, m+1, dtype=float)
+	terms = {"n": [], "c": [np.ones(m)], "ct": [np.ones(m), t], "ctt": [np.ones(m), t, t**2]}[regression]
+	terms = np.column_stack(terms) if terms else np.zeros((m, 0))
+	terms = np.broadcast_to(terms, X.shape[:1] + terms.shape)
+	level = X[:, lags:X.shape[-1]-1, None]
+	return view[..., 0], np.concatenate([terms, level, view[..., 1:]], axis=-1)
+
+
+
+def adfBatch(X, maxLag=None, regression="c", autolag="AIC"):
+	"""
+	Augmented Dickey-Fuller test of every row of X (one series per row),
+	matching stattools.adfuller(x, maxLag, regression, autolag) row by row.
+
+	The lagged designs of all series are stacked and solved together with
+	one batched QR factorization. With autolag ("AIC", "BIC" or "t-stat"),
+	every lag up to maxLag is fitted on the same sample, and since the models
+	are nested all their residual sums of squares come from the single QR of
+	the maxLag design. The test is then rerun at each series' chosen lag,
+	batching together the series that chose the same lag.
+
+	Returns a structured array of (stat, pvalue, lag, nobs, icbest) rows,
+	one per series. Constant series, which adfuller rejects, get NaN.
+	"""
+	X = np.asarray(X, dtype=float)
+	single = X.ndim == 1
+	X = np.atleast_2d(X)
+	if regression not in ("n", "c", "ct", "ctt"):
+		raise ValueError("regression must be one of 'n', 'c', 'ct' or 'ctt'")
+	n = X.shape[-1]
+	ntrend = 0 if regression == "n" else len(regression)
+	if maxLag is None:
+		#from Greene referencing Schwert 1989, as adfuller does
+		maxLag = min(n//2 - ntrend - 1, int(np.ceil(12.0 * np.power(n/100.0, 1/4.0))))
+		if maxLag < 0:
+			raise ValueError("series are too short for the regression terms")
+	elif maxLag > n//2 - ntrend - 1:
+		raise ValueError("maxLag must be less than n/2 - 1 - ntrend")
+
+	results = np.zeros(X.shape[0], dtype=ADF_DTYPE)
+	results["stat"] = results["pvalue"] = results["icbest"] = np.nan
+	valid = np.flatnonzero(X.max(axis=-1) > X.min(axis=-1))
+	lags = np.full(len(valid), maxLag)
+
+	if autolag is not None and len(valid):
+		method = autolag.lower()
+		y, A = _adfDesign(X[valid], maxLag, regression)
+		m = y.shape[-1]
+		R = np.linalg.qr(np.concatenate([A, y[..., None]], axis=-1), mode="r")
+		#residual sum of squares of the model on each prefix of the columns,
+		#from ntrend+1 columns (no lagged differences) to all of them
+		cols = np.arange(ntrend+1, A.shape[-1]+1)
+		rss = np.cumsum(R[:, ::-1, -1]**2, axis=1)[:, ::-1][:, cols]
+		rows = np.arange(len(valid))
+		if method in ("aic", "bic"):
+			penalty = 2.0 if method == "aic" else np.log(m)
+			ic = m*(np.log(2*np.pi) + np.log(rss/m) + 1) + penalty*cols
+			lags = np.argmin(ic, axis=1)
+			results["icbest"][valid] = ic[rows, lags]
+		elif method == "t-stat":
+			#the t statistic of each prefix's last column is read off R, and
+			#the longest lag whose last lag is significant is kept
+			with np.errstate(divide="ignore", invalid="ignore"):
+				t = np.abs(R[:, cols-1, -1]) / np.sqrt(rss/(m - cols))
+			significant = t >= 1.6448536269514722
+			lags = np.where(significant.any(axis=1), maxLag - np.argmax(significant[:, ::-1], axis=1), 0)
+			results["icbest"][valid] = t[rows, lags]
+		else:
+			raise ValueError("autolag must be 'AIC', 'BIC', 't-stat' or None")
+
+	for lag in np.unique(lags):
+		rows = valid[lags == lag]
+		y, A = _adfDesign(X[rows], lag, regression)
+		m, p = A.shape[-2:]
+		R = np.linalg.qr(np.concatenate([A, y[..., None]], axis=-1), mode="r")
+		try:
+			inv = np.linalg.inv(R[:, :p, :p])
+		except np.linalg.LinAlgError:
+			inv = np.linalg.pinv(R[:, :p, :p])
+		beta = np.matmul(inv, R[:, :p, p:])[..., ntrend, 0]
+		#standard error of the level coefficient, s^2 (R'R)^-1 = s^2 R^-1 R^-T
+		s = np.sqrt(R[:, p, p]**2 / (m - p))
+		results["stat"][rows] = beta / (s * np.sqrt((inv[:, ntrend, :]**2).sum(axis=-1)))
+		results["lag"][rows] = lag
+		results["nobs"][rows] = m
+
+	results["pvalue"][valid] = mackinnonp(results["stat"][valid], regression, 1)
+	return results[0] if single else results
+
+
+
+def _cointegrationRow(i, shared):
+	"""
+	Engle-Granger tests of series i regressed on every series, on the data
+	in shared. Each hedge ratio is one entry of the Gram matrix, and the
+	residuals of all the regressions are unit root tested in one batch.
+	"""
+	X = shared["X"]
+	gram = shared["gram"]
+	tss = shared["tss"]
+	with np.errstate(divide="ignore", invalid="ignore"):
+		beta = gram[i] / np.diag(gram)
+		rss = gram[i, i] - gram[i]*beta
+		collinear = rss/tss[i] <= 100*np.sqrt(np.finfo(float).eps)
+	resid = X[i] - beta[:, None]*X
+
+	stat = np.full(X.shape[0], np.nan)
+	test = np.flatnonzero(~collinear & (np.arange(X.shape[0]) != i))
+	if len(test):
+		stat[test] = adfBatch(resid[test], shared["maxLag"], "n", shared["autolag"])["stat"]
+	#the regression is (almost) perfect, as coint reports it
+	stat[collinear] = -np.inf
+	stat[i] = np.nan
+	return stat, mackinnonp(stat, shared["trend"], 2)
+
+
+
+def cointegrationMatrix(series, trend="n", maxLag=None, autolag="AIC", workers=None, path=None):
+	"""
+	Runs the Engle-Granger cointegration test for every ordered pair of
+	series, given as a DataFrame (one column per series) or a dict of
+	equally long series. Entry [dep, indep] matches
+	stattools.coint(dep, indep, trend, maxlag=maxLag, autolag=autolag).
+	The default trend="n" fits the hedge regression without a constant, as
+	the scripts' OLS(x, y) does.
+
+	The trend terms are partialled out of every series once, after which the
+	hedge regressions of all pairs come from one Gram matrix of the series'
+	cross products. The residuals of each dependent series on every other
+	are then tested together with adfBatch, and dependent series are spread
+	over a process pool of `workers` processes.
+
+	Returns (stat, pvalues) DataFrames indexed by [dep, indep]; the diagonal
+	is NaN. If path is given the p-value matrix is also written there as CSV.
+	"""
+	series = pandas.DataFrame(series)
+	names = series.columns
+	X = np.ascontiguousarray(series.values.T, dtype=float)
+	n = X.shape[1]
+	if trend not in ("n", "c", "ct", "ctt"):
+		raise ValueError("trend must be one of 'n', 'c', 'ct' or 'ctt'")
+
+	#residual sum of squares relative to the (centered) total, as OLS' rsquared
+	tss = (X**2).sum(axis=1) if trend == "n" else ((X - X.mean(axis=1)[:, None])**2).sum(axis=1)
+	if trend != "n":
+		t = np.arange(1, n+1, dtype=float)
+		terms = np.column_stack([np.ones(n), t, t**2][:len(trend)])
+		Q = np.linalg.qr(terms)[0]
+		X = X - X.dot(Q).dot(Q.T)
+	gram = X.dot(X.T)
+	shared = {"X": X, "gram": gram, "tss": tss, "trend": trend, "maxLag": maxLag, "autolag": autolag}
+	rows = _runPool(_cointegrationRow, range(len(names)), shared, workers)
+
+	stat = pandas.DataFrame(np.vstack([r[0] for r in rows]), index=names, columns=names)
+	pvalues = pandas.DataFrame(np.vstack([r[1] for r in rows]), index=names, columns=names)
+	if path is not None:
+		pvalues.to_csv(path)
+	return stat, pvalues
+
+
+
+#number of bins of each seasonal period supported by seasonality
+SEASONAL_BINS = {"weekday": 7, "month": 12, "hour": 24}
+
+def seasonality(data, period="weekday"):
+	"""
+	Chi-square test for seasonality of every column of a date indexed
+	DataFrame (or a single Series) at once. The values are summed into the
+	bins of the period ("weekday", "month" or "hour") with one groupby, and
+	each column's bin sums are tested against an even split of its total.
+
+	Returns a DataFrame with the chi2 statistic and p-value of each column.
+	"""
+	frame = pandas.DataFrame(data)
+	if period == "weekday":
+		codes = frame.index.weekday
+	elif period == "month":
+		codes = frame.index.month - 1
+	elif period == "hour":
+		codes = frame.index.hour
+	else:
+		raise ValueError("period must be one of " + ", ".join(sorted(SEASONAL_BINS)))
+	nbins = SEASONAL_BINS[period]
+
+	bins = frame.groupby(np.asarray(codes)).sum().reindex(range(nbins), fill_value=0).values
+	return _chiSquare(bins.T, frame.columns)
+
+
+
+def _chiSquare(bins, names):
+	"""
+	Tests each row of bin sums against an even split of its total, returning
+	seasonality's DataFrame of chi2 statistics and p-values indexed by names.
+	"""
+	exp = bins.sum(axis=-1)[:, None] / float(bins.shape[-1])
+	chiSquare = ((bins - exp)**2 / exp).sum(axis=-1)
+	return pandas.DataFrame({"chi2": chiSquare, "pvalue": scipy.stats.chi2.sf(chiSquare, bins.shape[-1]-1)},
+		index=names, columns=["chi2", "pvalue"])
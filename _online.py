@@ -0,0 +1,225 @@
+import os
+import json
+import datetime
+import numpy as np
+import pandas as pd
+import _math
+
+
+
+class OnlineStats(object):
+	"""
+	Running sufficient statistics of a set of daily series (one per name),
+	updated as new days arrive so that the tests can be recomputed without
+	rereading or refitting the history:
+
+	- sums and sums of squares, and the first and last maxLag values, from
+	  which the partial sums of any lag's overlapping window follow;
+	- the lagged cross products sum(x_i[t] * x_j[t+lag]) of every pair of
+	  series for lags 0..maxLag, giving autocovariances and cross products;
+	- weekday bin sums for the seasonality test;
+	- the Gram matrix of [constant, maxLag lags of every series, every
+	  series] over t >= maxLag, from which every Granger regression up to
+	  maxLag follows.
+
+	A new day costs O(k^2 * maxLag) for the lagged products and
+	O((k * maxLag)^2) for the rank-1 Gram update (k series), independent of
+	the length of the history. Values are stored minus a fixed shift (the
+	first day's values), which the correlations and regressions
+	are invariant to, to limit cancellation in the running sums.
+
+	If history is set, every appended day is also written to that raw file,
+	which series() memory-maps as a DataFrame.
+	"""
+
+	def __init__(self, names, maxLag, start, fill="ffill", history=None):
+		self.names = list(names)
+		self.maxLag = maxLag
+		self.start = pd.Timestamp(start)
+		self.fill = fill
+		self.history = history
+		k = len(self.names)
+		self.n = 0
+		self.shift = None
+		self.sums = np.zeros(k)
+		self.squares = np.zeros(k)
+		self.head = np.zeros((k, maxLag))
+		self.tail = np.zeros((k, maxLag))
+		self.products = np.zeros((k, k, maxLag+1))
+		self.bins = np.zeros((k, 7))
+		self.gram = np.zeros((1 + k*(maxLag+1),)*2)
+
+	@property
+	def end(self):
+		"""Date of the last day added."""
+		return self.start + datetime.timedelta(days=self.n-1)
+
+	def _add(self, raw):
+		if self.shift is None:
+			self.shift = raw.copy()
+		v = raw - self.shift
+		p = self.maxLag
+		#values at t, t-1, ..., t-maxLag (zeros before the first day)
+		lagged = np.column_stack([v, self.tail[:, ::-1]])
+
+		if self.n >= p:
+			z = np.concatenate([[1.0], lagged[:, 1:].ravel(), v])
+			self.gram += np.outer(z, z)
+		self.products += lagged[:, None, :] * v[None, :, None]
+		self.sums += v
+		self.squares += v**2
+		if self.n < p:
+			self.head[:, self.n] = v
+		if p:
+			self.tail = np.column_stack([self.tail[:, 1:], v])
+		self.bins[:, (self.start + datetime.timedelta(days=self.n)).weekday()] += raw
+		self.n += 1
+
+	def update(self, data):
+		"""
+		Appends the days of data, a DataFrame with a DatetimeIndex and one
+		column per name (or a Series for a single name). Days already added
+		are ignored, and missing days up to the last one of data are filled
+		like _data.loadDaily does (fill="ffill" or a value).
+		"""
+		data = pd.DataFrame(data)[self.names]
+		first = self.start if self.n == 0 else self.end + datetime.timedelta(days=1)
+		data = data[data.index >= first]
+		if not len(data):
+			return
+		days = pd.date_range(first, data.index.max())
+		data = data.reindex(days)
+		if self.fill == "ffill":
+			if self.n:
+				data.iloc[0] = data.iloc[0].fillna(pd.Series(self.tail[:, -1] + self.shift, index=self.names))
+			data = data.ffill()
+		else:
+			data = data.fillna(self.fill)
+
+		values = data.values.astype(float)
+		if np.isnan(values).any():
+			raise ValueError("missing values before the first day that can be filled")
+		for raw in values:
+			self._add(raw)
+		if self.history is not None:
+			with open(self.history, "ab") as f:
+				values.tofile(f)
+
+	def _windowSums(self):
+		#sums of the first n-lag and of the last n-lag values of every series,
+		#and the same for squares, shape (k, maxLag+1)
+		zero = np.zeros((len(self.names), 1))
+		headSums = np.concatenate([zero, np.cumsum(self.head, axis=1)], axis=1)
+		tailSums = np.concatenate([zero, np.cumsum(self.tail[:, ::-1], axis=1)], axis=1)
+		headSquares = np.concatenate([zero, np.cumsum(self.head**2, axis=1)], axis=1)
+		tailSquares = np.concatenate([zero, np.cumsum(self.tail[:, ::-1]**2, axis=1)], axis=1)
+		first = self.sums[:, None] - tailSums, self.squares[:, None] - tailSquares
+		last = self.sums[:, None] - headSums, self.squares[:, None] - headSquares
+		return first, last
+
+	def acf(self):
+		"""
+		Returns the autocorrelation function of every series up to maxLag,
+		shape (series, maxLag+1), as _math.acfBatch computes it.
+		"""
+		lags = np.arange(self.maxLag+1)
+		mean = self.sums / self.n
+		(first, _), (last, _) = self._windowSums()
+		products = self.products[np.arange(len(self.names)), np.arange(len(self.names))]
+		acov = products - mean[:, None]*(first + last) + (self.n - lags)*mean[:, None]**2
+		with np.errstate(divide="ignore", invalid="ignore"):
+			return acov / acov[:, :1]
+
+	def ljungBox(self):
+		"""The Ljung-Box test of the ACF of every series, as _math.ljungBoxBatch."""
+		return _math.ljungBox(self.acf(), self.n, self.maxLag)
+
+	def crossCorr(self, y, x):
+		"""
+		Returns the correlation of series y with the lagged series x for
+		lags 0..maxLag, as _math.crossCorr(y, x, maxLag).
+		"""
+		i = self.names.index(y)
+		j = self.names.index(x)
+		m = self.n - np.arange(self.maxLag+1)
+		(firstSums, firstSquares), (lastSums, lastSquares) = self._windowSums()
+		sx, sxx = firstSums[j], firstSquares[j]
+		sy, syy = lastSums[i], lastSquares[i]
+		with np.errstate(divide="ignore", invalid="ignore"):
+			cov = m*self.products[j, i] - sx*sy
+			varX = np.maximum(m*sxx - sx**2, 0.0)
+			varY = np.maximum(m*syy - sy**2, 0.0)
+			return cov / np.sqrt(varX*varY)
+
+	def _rss(self, cols, target):
+		#NaN if the columns are (next to) dependent, e.g. lags of a series of
+		#zeros, judged by the smallest eigenvalue of G scaled to unit diagonal
+		G = self.gram[np.ix_(cols, cols)]
+		g = self.gram[cols, target]
+		scale = np.sqrt(np.diag(G))
+		with np.errstate(divide="ignore", invalid="ignore"):
+			scaled = G / np.outer(scale, scale)
+		if not np.isfinite(scaled).all() or np.linalg.eigvalsh(scaled)[0] <= np.sqrt(np.finfo(float).eps):
+			return np.nan
+		return self.gram[target, target] - g.dot(np.linalg.solve(G, g))
+
+	def granger(self, endog, exog):
+		"""
+		Tests whether series exog Granger causes series endog for every lag
+		order up to maxLag on the common sample t >= maxLag, returning the
+		same table as _math.granger(endog, exog, maxLag). Each model's
+		residual sum of squares is solved from a block of the Gram matrix.
+		Orders that cannot be tested (e.g. a series of zeros) get NaN.
+		"""
+		p = self.maxLag
+		i = self.names.index(endog)
+		j = self.names.index(exog)
+		target = 1 + len(self.names)*p + i
+		lags = np.arange(1, p+1)
+		rssR = np.empty(p)
+		rssU = np.empty(p)
+		for lag in lags:
+			restricted = [0] + list(range(1 + i*p, 1 + i*p + lag))
+			rssR[lag-1] = self._rss(restricted, target)
+			rssU[lag-1] = self._rss(restricted + list(range(1 + j*p, 1 + j*p + lag)), target)
+		return _math._grangerTable(rssR, rssU, np.full(p, self.n - p), lags)
+
+	def seasonality(self):
+		"""The weekday chi-square test of every series, as _math.seasonality."""
+		return _math._chiSquare(self.bins, pd.Index(self.names))
+
+	def series(self):
+		"""
+		Memory-maps the history file written by update as a DataFrame, one
+		column per name, indexed by day.
+		"""
+		values = np.memmap(self.history, dtype=float, mode="r", shape=(self.n, len(self.names)))
+		index = pd.date_range(self.start, periods=self.n).rename("Date")
+		return pd.DataFrame(values, index=index, columns=self.names, copy=False)
+
+	def save(self, path):
+		"""Saves the state to path.json and path.npz, the json being written last."""
+		np.savez(path + ".npz", sums=self.sums, squares=self.squares, head=self.head, tail=self.tail,
+			products=self.products, bins=self.bins, gram=self.gram,
+			shift=self.shift if self.shift is not None else np.zeros(0))
+		meta = {"names": self.names, "maxLag": self.maxLag, "start": str(self.start.date()),
+			"fill": self.fill, "history": self.history, "n": self.n}
+		with open(path + ".json.tmp", "w") as f:
+			json.dump(meta, f)
+		os.rename(path + ".json.tmp", path + ".json")
+
+
+
+def load(path):
+	"""Loads an OnlineStats saved to path, or returns None if there is none."""
+	if not os.path.exists(path + ".json"):
+		return None
+	with open(path + ".json") as f:
+		meta = json.load(f)
+	stats = OnlineStats(meta["names"], meta["maxLag"], meta["start"], meta["fill"], meta["history"])
+	stats.n = meta["n"]
+	arrays = np.load(path + ".npz")
+	for name in ["sums", "squares", "head", "tail", "products", "bins", "gram"]:
+		setattr(stats, name, arrays[name])
+	stats.shift = arrays["shift"] if stats.n else None
+	return stats
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse
+from statsmodels.stats.multitest import multipletests
+import _math
+import _instrument
+
+
+
+class Panel(object):
+	"""
+	Per-patient monthly counts, held as a sparse (patient x month) CSR matrix
+	since most patients have no activity in most months. patients and months
+	label the rows and columns.
+	"""
+
+	def __init__(self, matrix, patients, months):
+		self.matrix = scipy.sparse.csr_matrix(matrix)
+		self.patients = pd.Index(patients)
+		self.months = pd.Index(months)
+
+	def __len__(self):
+		return len(self.patients)
+
+	def rows(self, patients):
+		"""
+		Returns the panel of the given patients, in that order. Patients
+		missing from the panel are left out.
+		"""
+		positions = self.patients.get_indexer(pd.Index(patients))
+		positions = positions[positions >= 0]
+		return Panel(self.matrix[positions], self.patients[positions], self.months)
+
+	def intersect(self, other):
+		"""
+		Returns (self, other) restricted to the patients in both panels, in
+		the order of self, with one hash lookup of self's patients in other.
+		"""
+		positions = other.patients.get_indexer(self.patients)
+		mine = np.flatnonzero(positions >= 0)
+		patients = self.patients[mine]
+		return (Panel(self.matrix[mine], patients, self.months),
+			Panel(other.matrix[positions[mine]], patients, other.months))
+
+	def total(self):
+		"""Sums every month over all patients, returning a Series by month."""
+		return pd.Series(np.asarray(self.matrix.sum(axis=0)).ravel(), index=self.months)
+
+	def cohortSums(self, cohorts):
+		"""
+		Sums every month over the patients of each cohort, given a Series
+		mapping patient ID to cohort. Patients without a cohort are left
+		out. The sums are one sparse product of a (cohort x patient)
+		indicator matrix with the panel, giving a (cohort x month) DataFrame.
+		"""
+		labels = pd.Series(self.patients.map(cohorts), index=self.patients)
+		codes, names = pd.factorize(labels)
+		keep = np.flatnonzero(codes >= 0)
+		indicator = scipy.sparse.csr_matrix((np.ones(len(keep)), (codes[keep], keep)),
+			shape=(len(names), len(self.patients)))
+		sums = indicator.dot(self.matrix).toarray()
+		return pd.DataFrame(sums, index=names, columns=self.months).sort_index()
+
+	def dense(self, patients=None):
+		"""
+		Returns a dense (patient x month) DataFrame of the given patients (all
+		by default). Only use this on subsets that fit in memory.
+		"""
+		panel = self if patients is None else self.rows(patients)
+		return pd.DataFrame(panel.matrix.toarray(), index=panel.patients, columns=panel.months)
+
+
+
+@_instrument.timed()
+def readPanel(path, chunksize=None):
+	"""
+	Reads a wide per-patient monthly CSV (a header row of months, then one
+	row per patient ID) into a Panel, dropping every month with a missing
+	value as dropna(axis=1) does on the dense frame.
+
+	With chunksize set, the file is read that many patients at a time, and
+	only each chunk's nonzero counts are kept, so memory is bounded by one
+	dense chunk plus the sparse panel.
+	"""
+	reader = pd.read_csv(path, index_col=0, chunksize=chunksize)
+	if chunksize is None:
+		reader = [reader]
+
+	rows, cols, data, patients = [], [], [], []
+	months = None
+	missing = None
+	offset = 0
+	for chunk in reader:
+		values = chunk.values.astype(float)
+		if months is None:
+			months = chunk.columns
+			missing = np.zeros(len(months), dtype=bool)
+		missing |= np.isnan(values).any(axis=0)
+		r, c = np.nonzero(np.nan_to_num(values))
+		rows.append(r + offset)
+		cols.append(c)
+		data.append(values[r, c])
+		patients.append(chunk.index)
+		offset += len(chunk)
+
+	if months is None:
+		return Panel(scipy.sparse.csr_matrix((0, 0)), [], [])
+	matrix = scipy.sparse.csr_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+		shape=(offset, len(months)))
+	keep = np.flatnonzero(~missing)
+	patients = pd.Index(np.concatenate([np.asarray(p) for p in patients]), name=patients[0].name)
+	return Panel(matrix[:, keep], patients, months[keep])
+
+
+
+def granger(effect, cause, lag, alpha=0.05, chunksize=10000):
+	"""
+	Tests, for every patient in both panels, whether the patient's cause
+	series Granger causes their effect series at the given lag, over the
+	months both panels have. Patients are densified and tested with
+	_math.grangerBatch chunksize at a time.
+
+	Returns a DataFrame indexed by patient with the F statistic, its p-value,
+	the Benjamini-Hochberg (FDR) corrected q-value and whether the test is
+	significant at alpha after correction. Patients that cannot be tested
+	(e.g. no activity) have NaN statistics and are left out of the
+	correction.
+	"""
+	effect, cause = effect.intersect(cause)
+	months = effect.months[effect.months.isin(cause.months)]
+	effectCols = effect.months.get_indexer(months)
+	causeCols = cause.months.get_indexer(months)
+
+	F = np.empty(len(effect))
+	pvalues = np.empty(len(effect))
+	for start in range(0, len(effect), chunksize):
+		rows = slice(start, start + chunksize)
+		F[rows], pvalues[rows] = _math.grangerBatch(effect.matrix[rows][:, effectCols].toarray(),
+			cause.matrix[rows][:, causeCols].toarray(), lag)
+
+	qvalues = np.full(len(effect), np.nan)
+	significant = np.zeros(len(effect), dtype=bool)
+	tested = np.flatnonzero(~np.isnan(pvalues))
+	if len(tested):
+		significant[tested], qvalues[tested] = multipletests(pvalues[tested], alpha, method="fdr_bh")[:2]
+	return pd.DataFrame({"F": F, "pvalue": pvalues, "qvalue": qvalues, "significant": significant},
+		index=effect.patients, columns=["F", "pvalue", "qvalue", "significant"])
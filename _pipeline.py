@@ -0,0 +1,151 @@
+import os
+import pickle
+import inspect
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+import pandas as pd
+import _data
+import _instrument
+
+
+
+def _funcKey(func):
+	"""
+	Identifies a stage function by its source code, so that editing it
+	invalidates the stage's cached output.
+	"""
+	try:
+		return inspect.getsource(func)
+	except (IOError, TypeError):
+		return getattr(func, "__module__", "") + "." + getattr(func, "__name__", repr(func))
+
+
+
+def _contentHash(output):
+	"""
+	Hashes a stage's output by its data, so that e.g. a frame read back from
+	a memory-mapped cache hashes the same as the frame it was built as.
+	Raises TypeError (or a pickling error) if the output cannot be hashed.
+	"""
+	if isinstance(output, (pd.Series, pd.DataFrame)):
+		names = [output.name] if isinstance(output, pd.Series) else output.columns
+		names = repr([str(name) for name in names])
+		data = pd.util.hash_pandas_object(output, index=True).values.tobytes() + names.encode("utf-8")
+	elif isinstance(output, np.ndarray):
+		data = np.ascontiguousarray(output).tobytes() + repr((output.dtype.str, output.shape)).encode("utf-8")
+	else:
+		data = pickle.dumps(output, pickle.HIGHEST_PROTOCOL)
+	return hashlib.sha1(data).hexdigest()
+
+
+
+class Pipeline(object):
+	"""
+	A DAG of named analysis stages. Each stage is a function called with the
+	outputs of its input stages (in order) and its own keyword parameters.
+
+	A stage's output is memoized under a hash of its function, parameters,
+	source files (by modification time and size) and the content hashes of
+	its inputs' outputs. Changing a parameter therefore only recomputes that
+	stage and whatever depends on it, and a recomputed stage whose output
+	did not change does not invalidate its dependents. Outputs are kept in
+	memory and, if cacheDir is set, pickled to disk for later runs.
+
+	Stages whose inputs are ready run concurrently on a thread pool of
+	`workers` threads, so independent branches execute in parallel.
+	"""
+
+	def __init__(self, cacheDir=None, workers=None):
+		self.stages = {}
+		self.cacheDir = cacheDir
+		self.workers = workers
+		self.memo = {}
+
+	def stage(self, name, func, inputs=(), sources=(), cache=True, **params):
+		"""
+		Adds (or replaces) the stage name, computing func(*inputs, **params).
+		sources lists files the stage reads, and cache=False disables the
+		on-disk cache for cheap stages or unpicklable outputs.
+		"""
+		self.stages[name] = (func, tuple(inputs), tuple(sources), cache, params)
+
+	def _order(self, targets):
+		order = []
+		visiting = set()
+		def visit(name):
+			if name in order:
+				return
+			if name in visiting:
+				raise ValueError("pipeline has a cycle through stage " + name)
+			if name not in self.stages:
+				raise KeyError("unknown stage " + name)
+			visiting.add(name)
+			for dep in self.stages[name][1]:
+				visit(dep)
+			order.append(name)
+		for name in targets:
+			visit(name)
+		return order
+
+	def _compute(self, name, inputs):
+		"""
+		Returns (output, content hash) of stage name given its inputs' results,
+		from memory, the disk cache, or by running it.
+		"""
+		func, deps, sources, cache, params = self.stages[name]
+		parts = [name, _funcKey(func), sorted(params.items()),
+			[result[1] for result in inputs], [_data._sourceKey(path) for path in sources]]
+		key = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+		if key in self.memo:
+			return self.memo[key]
+
+		path = None
+		if cache and self.cacheDir:
+			path = os.path.join(self.cacheDir, name + "-" + key + ".pkl")
+		if path is not None and os.path.exists(path):
+			with open(path, "rb") as f:
+				result = pickle.load(f)
+		else:
+			with _instrument.stage(name) as timer:
+				output = func(*[result[0] for result in inputs], **params)
+				if hasattr(output, "shape"):
+					timer.rows = output.shape[0]
+			try:
+				content = _contentHash(output)
+			except (pickle.PicklingError, TypeError, AttributeError):
+				#unpicklable outputs are only identified by their stage key
+				content = key
+				path = None
+			result = (output, content)
+			if path is not None:
+				if not os.path.isdir(self.cacheDir):
+					os.makedirs(self.cacheDir)
+				with open(path + ".tmp", "wb") as f:
+					pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+				os.rename(path + ".tmp", path)
+
+		self.memo[key] = result
+		return result
+
+	def run(self, targets=None):
+		"""
+		Runs the target stages (all by default) and everything upstream of them,
+		returning a dict of the outputs of every stage that ran.
+		"""
+		targets = sorted(self.stages) if targets is None else list(targets)
+		order = self._order(targets)
+		results = {}
+		pending = list(order)
+		running = {}
+		with ThreadPoolExecutor(max_workers=self.workers or len(order) or 1) as pool:
+			while pending or running:
+				for name in list(pending):
+					if all(dep in results for dep in self.stages[name][1]):
+						inputs = [results[dep] for dep in self.stages[name][1]]
+						running[pool.submit(self._compute, name, inputs)] = name
+						pending.remove(name)
+				done = wait(list(running), return_when=FIRST_COMPLETED)[0]
+				for future in done:
+					results[running.pop(future)] = future.result()
+		return dict((name, result[0]) for name, result in results.items())
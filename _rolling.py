@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import scipy.stats
+import _math
+
+
+
+def _windowSums(values, window):
+	"""
+	Sums of every run of `window` consecutive entries along the first axis,
+	as differences of one cumulative sum: adding the entry entering the
+	window and removing the one leaving it, for every position at once.
+	"""
+	total = np.cumsum(values, axis=0)
+	sums = total[window-1:].copy()
+	sums[1:] -= total[:-window]
+	return sums
+
+
+
+def _labels(series, window):
+	#each window is labelled by the index of its last point
+	index = getattr(series, "index", None)
+	if index is None:
+		index = pd.RangeIndex(len(series))
+	return index[window-1:]
+
+
+
+def rollingGranger(endog, exog, lag, window):
+	"""
+	Tests whether exog Granger causes endog at the given lag in every window
+	of `window` consecutive points, i.e. _math.granger(endog[s:s+window],
+	exog[s:s+window], lag) at that lag for every start s (window-lag
+	regressions each).
+
+	The cross products of the lagged design [constant, endog lags, exog lags,
+	endog] are accumulated once, so each window's Gram matrix costs O(p^2)
+	to get from its neighbour's instead of being rebuilt from its rows. The
+	series are centered first, which the regressions are invariant to, to
+	limit cancellation in the running sums. Each window still needs a
+	p x p solve for its residual sums of squares.
+
+	Windows that cannot be tested (a singular design, or one fitting endog
+	exactly) get NaN, as in _math.grangerBatch.
+
+	Returns a DataFrame with the F statistic and p-value of every window,
+	indexed by the window's last point (the series' index if given).
+	"""
+	y = np.asarray(endog, dtype=float)
+	x = np.asarray(exog, dtype=float)
+	if window <= 3*lag + 1:
+		raise ValueError("window must leave more observations than regressors")
+	y = y - y.mean()
+	x = x - x.mean()
+	yLags = _math.lagView(y, lag)
+	xLags = _math.lagView(x, lag)
+	z = np.column_stack([np.ones(yLags.shape[0]), yLags[:, 1:], xLags[:, 1:], yLags[:, 0]])
+	m = window - lag
+	gram = _windowSums(z[:, :, None] * z[:, None, :], m)
+
+	restricted = list(range(lag+1))
+	unrestricted = restricted + list(range(lag+1, 2*lag+1))
+	#windows whose unrestricted design is (next to) singular, e.g. a run of
+	#days without any exog, cannot be tested. The smallest eigenvalue of the
+	#Gram matrix scaled to unit diagonal tells them apart.
+	G = gram[:, unrestricted][:, :, unrestricted]
+	scale = np.sqrt(np.diagonal(G, axis1=1, axis2=2))
+	with np.errstate(divide="ignore", invalid="ignore"):
+		scaled = G / scale[:, :, None] / scale[:, None, :]
+	singular = ~np.isfinite(scaled).all(axis=(1, 2))
+	scaled[singular] = np.eye(len(unrestricted))
+	singular |= np.linalg.eigvalsh(scaled)[:, 0] <= np.sqrt(np.finfo(float).eps)
+
+	def rss(cols):
+		G = gram[:, cols][:, :, cols]
+		G[singular] = np.eye(len(cols))
+		g = gram[:, cols, -1]
+		return gram[:, -1, -1] - (g * np.linalg.solve(G, g[..., None])[..., 0]).sum(axis=-1)
+
+	rssR = rss(restricted)
+	rssU = rss(unrestricted)
+	#and neither can windows the unrestricted model fits exactly
+	tss = gram[:, -1, -1] - gram[:, 0, -1]**2 / m
+	singular |= rssU <= 100*np.sqrt(np.finfo(float).eps) * tss
+	dfDenom = m - 2*lag - 1
+	with np.errstate(divide="ignore", invalid="ignore"):
+		F = (rssR - rssU) / lag / (rssU / dfDenom)
+	F[singular] = np.nan
+	return pd.DataFrame({"F": F, "F_pvalue": scipy.stats.f.sf(F, lag, dfDenom)},
+		index=_labels(endog, window), columns=["F", "F_pvalue"])
+
+
+
+def rollingCrossCorr(tsY, tsX, maxLag, window):
+	"""
+	The cross-correlations _math.crossCorr(tsY[s:s+window], tsX[s:s+window],
+	maxLag) of every window of `window` consecutive points, from windowed
+	sums of the lagged products and of each series' overlapping parts.
+	A full sweep costs O(n * maxLag) whatever the window.
+
+	Returns a DataFrame with one column per lag, indexed by the window's last
+	point (the series' index if given).
+	"""
+	y = np.asarray(tsY, dtype=float)
+	x = np.asarray(tsX, dtype=float)
+	n = y.shape[0]
+	if maxLag >= window - 1:
+		raise ValueError("maxLag must be smaller than the window minus one")
+	y = y - y.mean()
+	x = x - x.mean()
+
+	windows = n - window + 1
+	R = np.empty((windows, maxLag+1))
+	for lag in range(maxLag+1):
+		m = window - lag
+		#x uses the first window-lag values of each window, y the last ones
+		sxy = _windowSums(x[:n-lag] * y[lag:], m)[:windows]
+		sx = _windowSums(x, m)[:windows]
+		sxx = _windowSums(x**2, m)[:windows]
+		sy = _windowSums(y, m)[lag:lag+windows]
+		syy = _windowSums(y**2, m)[lag:lag+windows]
+		with np.errstate(divide="ignore", invalid="ignore"):
+			cov = m*sxy - sx*sy
+			varX = np.maximum(m*sxx - sx**2, 0.0)
+			varY = np.maximum(m*syy - sy**2, 0.0)
+			R[:, lag] = cov / np.sqrt(varX*varY)
+	return pd.DataFrame(R, index=_labels(tsY, window), columns=pd.RangeIndex(maxLag+1, name="lag"))
@@ -0,0 +1,114 @@
+import numpy as np
+import _math
+
+
+
+def surrogates(x, count, rng, method="shift", block=None, minShift=1):
+	"""
+	Returns a (count x n) array of surrogates of the series x, built by index
+	arithmetic on one gather from x:
+
+	"shift" - circular shifts of x by a random minShift..n-minShift steps,
+	          which keep its whole autocorrelation but break its timing
+	          against other series.
+	"block" - circular moving block bootstrap, x cut into blocks of `block`
+	          consecutive values (n^(1/3) by default) drawn at random starts.
+	"""
+	x = np.asarray(x, dtype=float)
+	n = x.shape[-1]
+	if method == "shift":
+		if n - 2*minShift < 0:
+			raise ValueError("series is too short for shifts of at least minShift")
+		index = np.arange(n) + rng.integers(minShift, n - minShift + 1, count)[:, None]
+	elif method == "block":
+		block = block or max(1, int(round(n ** (1/3.0))))
+		blocks = -(-n // block)
+		starts = rng.integers(0, n, (count, blocks))
+		index = (starts[:, :, None] + np.arange(block)).reshape(count, -1)[:, :n]
+	else:
+		raise ValueError("method must be 'shift' or 'block'")
+	return x[index % n]
+
+
+
+def _exceedances(task, shared):
+	"""
+	Counts how many of a batch of surrogates of one pair's exog series give
+	a statistic at least as large as the observed one, on the data in shared.
+	"""
+	pair, count, seed = task
+	rng = np.random.default_rng(seed)
+	endog = shared["endog"][pair]
+	#shifts within lag of the original would carry over the lagged relation
+	exog = surrogates(shared["exog"][pair], count, rng, shared["method"], shared["block"], shared["lag"]+1)
+	observed = shared["observed"][pair]
+	if shared["statistic"] == "crossCorr":
+		stat = np.abs(_math.crossCorr(endog, exog, shared["lag"]))
+		return (stat >= np.abs(observed)).sum(axis=0)
+	stat = _math.grangerBatch(endog, exog, shared["lag"])[0]
+	return (stat >= observed).sum(axis=0)
+
+
+
+def _significance(statistic, endog, exog, lag, observed, count, method, block, seed, workers, batch):
+	#every pair's surrogates are split into batches, each with its own
+	#child seed, so results do not depend on the number of workers
+	tasks = [(pair, min(batch, count - start)) for pair in range(endog.shape[0])
+		for start in range(0, count, batch)]
+	seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+	tasks = [(pair, size, s) for (pair, size), s in zip(tasks, seeds)]
+	shared = {"statistic": statistic, "endog": endog, "exog": exog, "lag": lag,
+		"observed": observed, "method": method, "block": block}
+	counts = np.zeros(observed.shape)
+	for (pair, size, s), exceed in zip(tasks, _math._runPool(_exceedances, tasks, shared, workers)):
+		counts[pair] += exceed
+	with np.errstate(invalid="ignore"):
+		return np.where(np.isnan(observed), np.nan, (1 + counts) / (1.0 + count))
+
+
+
+def crossCorrSignificance(endog, exog, maxLag, count=10000, method="shift", block=None,
+		seed=None, workers=None, batch=1000):
+	"""
+	Resampling p-values of the cross-correlations _math.crossCorr(endog,
+	exog, maxLag), for one pair of series or one pair per row of 2-D
+	arrays. exog is replaced by `count` surrogates (see surrogates) and the
+	p-value of each lag is (1 + number of surrogates with |R| >= |R
+	observed|) / (1 + count).
+
+	Surrogates are made and correlated `batch` at a time as one 2-D array,
+	over a process pool of `workers` processes. seed makes runs
+	reproducible, whatever the number of workers.
+
+	Returns (R, pvalues) arrays of shape (pairs, maxLag+1), or 1-D for 1-D
+	input.
+	"""
+	single = np.ndim(endog) == 1 and np.ndim(exog) == 1
+	endog, exog = np.broadcast_arrays(np.atleast_2d(np.asarray(endog, dtype=float)),
+		np.atleast_2d(np.asarray(exog, dtype=float)))
+	R = _math.crossCorr(endog, exog, maxLag)
+	pvalues = _significance("crossCorr", endog, exog, maxLag, R, count, method, block, seed, workers, batch)
+	return (R[0], pvalues[0]) if single else (R, pvalues)
+
+
+
+def grangerSignificance(endog, exog, lag, count=10000, method="shift", block=None,
+		seed=None, workers=None, batch=1000):
+	"""
+	Resampling p-values of the Granger F test of exog onto endog at the
+	given lag (_math.grangerBatch), for one pair of series or one pair per
+	row of 2-D arrays. exog is replaced by `count` surrogates and the p-value
+	is (1 + number of surrogates with F >= F observed) / (1 + count).
+
+	Surrogates are tested `batch` at a time with one batched QR, over a
+	process pool of `workers` processes. seed makes runs reproducible,
+	whatever the number of workers.
+
+	Returns (F, pvalues), scalars for 1-D input and arrays otherwise.
+	"""
+	single = np.ndim(endog) == 1 and np.ndim(exog) == 1
+	endog, exog = np.broadcast_arrays(np.atleast_2d(np.asarray(endog, dtype=float)),
+		np.atleast_2d(np.asarray(exog, dtype=float)))
+	F = _math.grangerBatch(endog, exog, lag)[0]
+	pvalues = _significance("granger", endog, exog, lag, F, count, method, block, seed, workers, batch)
+	return (F[0], pvalues[0]) if single else (F, pvalues)
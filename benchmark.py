@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import timeit
+import argparse
+import datetime
+import platform
+import itertools
+import subprocess
+import numpy as np
+import pandas as pd
+import _math
+import _data
+import _battery
+
+"""
+Benchmarks of the _math kernels and the analysis steps of the scripts, on
+synthetic data made in process, at every combination of the parameters of
+each benchmark.
+
+	python benchmark.py                   run everything, writing the results
+	                                      to benchmarks/<commit>.json
+	python benchmark.py --quick -k granger  only the smallest sizes of the
+	                                      benchmarks whose name has "granger"
+	python benchmark.py --compare benchmarks/a.json benchmarks/b.json
+	                                      compare two runs, flagging every
+	                                      benchmark that got slower
+
+Each result is the best time of REPEAT runs, each averaging as many calls as
+timeit.autorange needs to take at least 0.2 seconds.
+"""
+
+####################CONSTANTS###################
+REPEAT = 5
+#slowdown ratio reported as a regression by --compare
+THRESHOLD = 1.1
+OUTPUT_DIR = "benchmarks"
+
+
+####################BENCHMARKS###################
+#name, parameter grid and setup function of every benchmark. Each setup
+#makes the data for one combination of parameters and returns the function
+#to time.
+BENCHMARKS = []
+
+def benchmark(**grid):
+	def register(setup):
+		BENCHMARKS.append((setup.__name__, grid, setup))
+		return setup
+	return register
+
+
+def _series(n, seed=0, count=None):
+	rng = np.random.RandomState(seed)
+	shape = (n,) if count is None else (count, n)
+	return rng.poisson(100, shape).astype(float)
+
+
+@benchmark(n=[110, 730, 5000], maxLag=[6, 30])
+def cc_ols(n, maxLag):
+	y, x = _series(n, 0), _series(n, 1)
+	return lambda: _math.cc_ols(y, x, maxLag)
+
+
+@benchmark(n=[110, 730, 5000], maxLag=[6, 30])
+def ljungBox(n, maxLag):
+	ACF = _math.acfBatch(_series(n), maxLag)
+	return lambda: _math.ljungBox(ACF, n, maxLag)
+
+
+@benchmark(n=[110, 730, 5000], maxLag=[6, 30])
+def ljungBox2(n, maxLag):
+	x = _series(n)
+	return lambda: _math.ljungBox2(x, maxLag)
+
+
+@benchmark(days=[731, 7305], categories=[1, 4, 16])
+def resample(days, categories):
+	index = pd.date_range("2011-01-01", periods=days).rename("Date")
+	data = pd.DataFrame(_series(days, count=categories).T, index=index, columns=range(1, categories+1))
+	return lambda: _data.resample(data, 7)
+
+
+@benchmark(rows=[100000, 1000000], users=[10000, 100000], categories=[4, 16])
+def categoryCounts(rows, users, categories):
+	rng = np.random.RandomState(0)
+	dates = pd.date_range("2011-01-01", periods=761)[rng.randint(0, 761, rows)]
+	visits = pd.Series(rng.randint(0, users, rows), index=dates)
+	#a tenth of the users have no category, as in the real files
+	cats = pd.Series(rng.randint(1, categories+1, users), index=np.arange(users)).iloc[users//10:]
+	return lambda: _data.categoryCounts(visits, cats, list(range(1, categories+1)))
+
+
+@benchmark(weeks=[110, 520], categories=[4, 16], maxLag=[10, 30])
+def grangerBattery(weeks, categories, maxLag):
+	index = pd.date_range("2011-01-01", periods=weeks, freq="7D")
+	metrics = dict((name, pd.DataFrame(_series(weeks, seed, categories).T, index=index,
+		columns=range(1, categories+1))) for seed, name in enumerate(["logins", "calls", "apps"]))
+	pairs = [("calls", "logins"), ("apps", "logins"), ("apps", "calls")]
+	return lambda: _battery.runBattery(metrics, pairs, maxLag, workers=1)
+
+
+def _combinations(grid, quick):
+	names = sorted(grid)
+	values = [grid[name][:1] if quick else grid[name] for name in names]
+	return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def _commit():
+	try:
+		commit = subprocess.check_output(["git", "rev-parse", "HEAD"]).decode().strip()
+		dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"]).strip())
+	except (OSError, subprocess.CalledProcessError):
+		return "unknown", False
+	return commit, dirty
+
+
+def run(pattern=None, quick=False):
+	"""Runs the benchmarks whose name contains pattern, returning the report."""
+	commit, dirty = _commit()
+	report = {"commit": commit, "dirty": dirty, "date": datetime.datetime.now().isoformat(),
+		"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+		"machine": platform.machine(), "cpus": os.cpu_count(), "results": []}
+	for name, grid, setup in BENCHMARKS:
+		if pattern and pattern not in name:
+			continue
+		for params in _combinations(grid, quick):
+			timer = timeit.Timer(setup(**params))
+			number = timer.autorange()[0]
+			times = [t / number for t in timer.repeat(REPEAT, number)]
+			result = {"name": name, "params": params, "best": min(times),
+				"median": float(np.median(times)), "number": number, "repeat": REPEAT}
+			report["results"].append(result)
+			print("%-16s %-50s %12.6f s" % (name, json.dumps(params, sort_keys=True), result["best"]))
+	return report
+
+
+def compare(old, new, threshold=THRESHOLD):
+	"""
+	Prints the best time of every benchmark in both reports and their ratio,
+	returning the number of benchmarks at least threshold times slower.
+	"""
+	def key(result):
+		return result["name"], json.dumps(result["params"], sort_keys=True)
+	before = dict((key(result), result["best"]) for result in old["results"])
+	regressions = 0
+	print("%-16s %-50s %12s %12s %8s" % ("benchmark", "params", old["commit"][:10], new["commit"][:10], "ratio"))
+	for result in new["results"]:
+		if key(result) not in before:
+			continue
+		ratio = result["best"] / before[key(result)]
+		flag = ""
+		if ratio >= threshold:
+			flag = "  SLOWER"
+			regressions += 1
+		elif ratio <= 1.0/threshold:
+			flag = "  faster"
+		print("%-16s %-50s %12.6f %12.6f %8.2f%s" % (key(result) + (before[key(result)], result["best"], ratio, flag)))
+	return regressions
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Benchmarks of the analysis kernels.")
+	parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this")
+	parser.add_argument("--quick", action="store_true", help="only run the smallest parameters")
+	parser.add_argument("--output", help="file to write the results to")
+	parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+	parser.add_argument("--threshold", type=float, default=THRESHOLD)
+	args = parser.parse_args()
+
+	if args.compare:
+		with open(args.compare[0]) as f:
+			old = json.load(f)
+		with open(args.compare[1]) as f:
+			new = json.load(f)
+		sys.exit(1 if compare(old, new, args.threshold) else 0)
+
+	report = run(args.pattern, args.quick)
+	output = args.output or os.path.join(OUTPUT_DIR, report["commit"][:10] + ("-dirty" if report["dirty"] else "") + ".json")
+	if os.path.dirname(output) and not os.path.isdir(os.path.dirname(output)):
+		os.makedirs(os.path.dirname(output))
+	with open(output, "w") as f:
+		json.dump(report, f, indent=1)
+	print("results written to "+output)
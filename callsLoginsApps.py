@@ -12,159 +12,147 @@ from statsmodels.stats import diagnostic
 from statsmodels.regression.linear_model import OLS
 import statsmodels
 import _math
+import _data
+import _pipeline
+import _rolling
+import _instrument
 
 # ####################CONSTANTS###################
 MAX_LAG = 30
-
-
-# ####################LOAD DATA###################
-x = pd.read_csv("loginsPerDay.csv", header=None, index_col=0, parse_dates=True)
-y = pd.read_csv("callsPerDay.csv", header=None, index_col=0, parse_dates=True)
-z = pd.read_csv("appsPerDay.csv", header=None, index_col=0, parse_dates=True)
-
+#weeks in each window of the rolling tests, and their lag
+WINDOW = 52
+ROLLING_LAG = 2
 #set index to the range between Jan 1 2011 - Feb 1 2013, since data may miss some days
-newIndex = pd.date_range(start=datetime.datetime(2011, 1, 1), end=datetime.datetime(2013, 2, 1)).rename("Date")
-x = x.reindex(newIndex)
-y = y.reindex(newIndex)
-z = z.reindex(newIndex)
-
-#convert to string, since stattools is unhappy with datetimes
-newIndex = pd.Index(data=[dt.strftime("%m/%d/%y") for dt in newIndex])
-x = x.set_index(newIndex)
-y = y.set_index(newIndex)
-z = z.set_index(newIndex)
-
-x = pd.Series(data=x[1], index=x.index)
-y = pd.Series(data=y[1], index=y.index)
-z = pd.Series(data=z[1], index=z.index)
-
-x = x.fillna(0)
-y = y.fillna(0)
-z = z.fillna(0)
-
+START = datetime.datetime(2011, 1, 1)
+END = datetime.datetime(2013, 2, 1)
+#name and daily count file of every metric
+METRICS = [("logins", "loginsPerDay.csv"), ("calls", "callsPerDay.csv"), ("apps", "appsPerDay.csv")]
 
-newIndex = [x.index[i] for i in range (0, len(z.index), 7)]
 
-listX = [x[i:i+7] for i in range(0, len(x), 7)]
-xWeekly = []
-for week in listX:
-	val = week.sum()
-	xWeekly.append(val)
-x = pd.Series(xWeekly, index=newIndex)
+# ####################STAGES###################
+#each step below is a stage of the pipeline at the bottom, which only reruns
+#the stages whose inputs or parameters changed since the last run.
+def weekly(*series, **params):
+	#sum every metric into weeks, one column per metric
+	return _data.resample(pd.concat(series, axis=1, keys=params["names"]), 7)
 
-listY = [y[i:i+7] for i in range(0, len(y), 7)]
-yWeekly = []
-for week in listY:
-	val = week.sum()
-	yWeekly.append(val)
-y = pd.Series(yWeekly, index=newIndex)
-
-listZ = [z[i:i+7] for i in range(0, len(z), 7)]
-zWeekly = []
-for week in listZ:
-	val = week.sum()
-	zWeekly.append(val)
-z = pd.Series(zWeekly, index=newIndex)
-
-
-print(x)
-print(y)
-print(z)
-
-
-# ####################PRE-ANALYSIS####################
 #1. Augmented Dickey-Fuller test for unit root to test if stationary (if not,
 #take I(2) series, etc.).
-results = stattools.adfuller(x)
-print("ADF logins per day:")
-print("stat: "+str(results[0]))
-print("pval: "+str(results[1]))
-
-results = stattools.adfuller(y)
-print("ADF calls per day:")
-print("stat: "+str(results[0]))
-print("pval: "+str(results[1]))
-
-results = stattools.adfuller(z)
-print("ADF apps per day:")
-print("stat: "+str(results[0]))
-print("pval: "+str(results[1]))
+def adf(data):
+	results = _math.adfBatch(data.values.T)
+	return pd.DataFrame({"stat": results["stat"], "pval": results["pvalue"]},
+		index=data.columns, columns=["stat", "pval"])
 
 #2. Chi-Square for seasonality
-#group values by day
-def testChiSquare(series):
-	days = series.index.tolist()
-	vals = series.tolist()
-	data = zip(days, vals)
-	bins = [0 for i in range(7)]
-	for line in data:
-		bins[datetime.datetime.strptime(line[0], "%m/%d/%y").weekday()] += line[1]
-
-	exp = [sum(vals)/7 for i in range (7)]
-	print exp
-
-	chiSquare = 0
-	for i in range(7):
-		chiSquare += (bins[i] - exp[i])**2/exp[i]
-
-	print chiSquare
-	print scipy.stats.chi2.sf(chiSquare, 6)
-
-print("logins seasonality")
-testChiSquare(x)
-print("calls seasonality")
-testChiSquare(y)
-print("apps seasonality")
-testChiSquare(z)
+#group values by day of the week
+def seasonality(data):
+	return _math.seasonality(data)
 
 ############COINTEGRATION TEST############
 #test to see if both series move in same general direction.
 #fit OLS to both series, and run ADF on residuals. Stationary residuals
 #indicate that the series is cointegrate, while nonstationary means they
 #are not cointegrated.
-#x=logins, y-calls
-results = OLS(x.values, y.values).fit()
-print(results.params)
-print(results.pvalues)
-resultsADF = stattools.adfuller(results.resid)
-print(resultsADF)
 #this adf test is opposite of standard. H0 -> non-stationary, while
 #ha -> stationary
 #want small p-value
+def cointegration(data, dep, indep):
+	results = OLS(data[dep].values, data[indep].values).fit()
+	return results.params, results.pvalues, stattools.adfuller(results.resid)
+
+#the Engle-Granger test of every metric regressed on every other one
+def cointegrationPairs(data):
+	return _math.cointegrationMatrix(data)[1]
 
 ###############GRANGER TEST#################
-def grangerTest(exog, endog):
-	MAX_LAG = 30
-	ARaic = ar_model.AR(exog.tolist()).fit(maxlag=MAX_LAG, ic="aic")
-	ARbic = ar_model.AR(exog.tolist()).fit(maxlag=MAX_LAG, ic="bic")
-	#select the fewer number of parameters between both criteria.
-	numExog = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
-
-	print("Optimal number of lags for exog data is "+str(numExog))
-
-	ARaic = ar_model.AR(endog.tolist()).fit(maxlag=MAX_LAG, ic="aic")
-	ARbic = ar_model.AR(endog.tolist()).fit(maxlag=MAX_LAG, ic="bic")
-	#select the fewer number of parameters between both criteria.
-	numEndog = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
-
-	print("Optimal number of lags for endog data is "+str(numEndog))
-
-	#now that I know the optimal number of parameters, I can call the
-	#granger causality function of statsmodels.
-	data = pd.concat([endog, exog], axis=1)
-	print("\nGranger causality results of indep onto dep")
-	results = stattools.grangercausalitytests(data, maxlag=numEndog)
-
-	data = pd.concat([exog, endog], axis=1)
-	print("\nGranger causality results of dep onto indep")
-	results = stattools.grangercausalitytests(data, maxlag=numExog)
-	regr = results[2][1]
-	print(regr[0].params)
-	print(regr[1].params)
-	print(regr[1].pvalues)
+def grangerTest(data, exog, endog, maxLag):
+	exog = data[exog]
+	endog = data[endog]
+	#select the fewer number of lags between both criteria.
+	numExog = min(_math.selectOrder(exog.values, maxLag))
+	numEndog = min(_math.selectOrder(endog.values, maxLag))
+
+	#now that I know the optimal number of parameters, I can run the
+	#granger causality test for every lag up to it.
+	indepOntoDep = _math.granger(endog.values, exog.values, numEndog)
+	depOntoIndep = _math.granger(exog.values, endog.values, numExog)
+
+	#restricted and unrestricted regressions of dep onto indep at lag 2
+	dep, design = _math.lagMatrix(exog.values, endog.values, endogLags=2, exogLags=2, constant=True)
+	restricted = OLS(dep, design[:, :3]).fit()
+	unrestricted = OLS(dep, design).fit()
+	return {"numExog": numExog, "numEndog": numEndog,
+		"indepOntoDep": indepOntoDep, "depOntoIndep": depOntoIndep,
+		"restricted": restricted.params, "unrestricted": unrestricted.params,
+		"unrestrictedPvalues": unrestricted.pvalues}
+
+
+#granger test and cross-correlations of a window sliding one week at a time,
+#to see whether the effect changed over time
+def rolling(data, exog, endog, lag, window):
+	return (_rolling.rollingGranger(data[endog], data[exog], lag, window),
+		_rolling.rollingCrossCorr(data[endog], data[exog], lag, window))
+
+
+# ####################PIPELINE###################
+pipeline = _pipeline.Pipeline(cacheDir=_data.CACHE_DIR)
+#loading is already cached by _data, and the loaded metrics run in parallel
+for name, path in METRICS:
+	pipeline.stage(name, _data.loadDaily, sources=[path], cache=False,
+		path=path, column=1, start=START, end=END, header=None, fill=0)
+pipeline.stage("weekly", weekly, inputs=[name for name, path in METRICS],
+	names=[name for name, path in METRICS])
+pipeline.stage("adf", adf, inputs=["weekly"])
+pipeline.stage("seasonality", seasonality, inputs=["weekly"])
+#x=logins, y-calls
+pipeline.stage("cointegration", cointegration, inputs=["weekly"], dep="logins", indep="calls")
+pipeline.stage("cointegrationPairs", cointegrationPairs, inputs=["weekly"])
+pipeline.stage("granger", grangerTest, inputs=["weekly"], exog="calls", endog="logins", maxLag=MAX_LAG)
+pipeline.stage("rolling", rolling, inputs=["weekly"], exog="calls", endog="logins",
+	lag=ROLLING_LAG, window=WINDOW)
+
+#every stage is timed on its own when instrumentation is on
+with _instrument.stage("pipeline"):
+	results = pipeline.run()
+
+
+# ####################REPORT###################
+print(results["weekly"])
+
+for name, row in results["adf"].iterrows():
+	print("ADF "+name+" per day:")
+	print("stat: "+str(row["stat"]))
+	print("pval: "+str(row["pval"]))
+
+print("seasonality")
+print(tabulate(results["seasonality"], headers="keys"))
+
+params, pvalues, resultsADF = results["cointegration"]
+print(params)
+print(pvalues)
+print(resultsADF)
+print("pairwise cointegration p-values")
+print(tabulate(results["cointegrationPairs"], headers="keys"))
 
+granger = results["granger"]
 print("indep = calls, dep = logins")
-grangerTest(y, x)
+print("Optimal number of lags for exog data is "+str(granger["numExog"]))
+print("Optimal number of lags for endog data is "+str(granger["numEndog"]))
+print("\nGranger causality results of indep onto dep")
+print(granger["indepOntoDep"])
+print("\nGranger causality results of dep onto indep")
+print(granger["depOntoIndep"])
+print(granger["restricted"])
+print(granger["unrestricted"])
+print(granger["unrestrictedPvalues"])
+
+rollingGranger, rollingCC = results["rolling"]
+print("\nRolling granger causality results of calls onto logins")
+print(rollingGranger)
+print("\nRolling cross-correlation of logins with lagged calls")
+print(rollingCC)
+
+x = results["weekly"]["logins"]
 
 
 
@@ -12,178 +12,85 @@ from statsmodels.stats import diagnostic
 from statsmodels.regression.linear_model import OLS
 import statsmodels
 import _math
+import _data
+import _battery
+import _surrogate
+import _instrument
 
 # ####################CONSTANTS###################
 MAX_LAG = 30
+#lag used when testing every pair of series against each other
+PAIR_LAG = 4
+#patient categories to count, and the one analysed on its own below
+CATEGORIES = [1, 2, 3, 4]
+CATEGORY = 4
+#rows of the per user files read at a time, or None to read them whole
+CHUNKSIZE = 1000000
+#(indep, dep) metric pairs tested, and whether to also run the whole battery
+#on every category with a process pool (workers=None uses every core)
+PAIRS = [("calls", "logins"), ("apps", "logins"), ("apps", "calls")]
+PARALLEL = True
+WORKERS = None
+#surrogates drawn for the resampling p-values, and their seed
+SURROGATES = 10000
+SEED = 0
 
 
 # ####################LOAD DATA###################
+#each step below is timed until the next one starts when instrumentation is
+#on (see _instrument)
+_instrument.step("load categories")
 cats = pd.read_csv("patientCategories.csv", header=None, index_col=0).iloc[:,0]
 #order: ID, category
-x = pd.read_csv("loginsPerDayPerUser.csv", header=None, index_col=0, parse_dates=True)
-y = pd.read_csv("callsPerDayPerUser.csv", header=None, index_col=0, parse_dates=True)
-z = pd.read_csv("appsPerDayPerUser.csv", header=None, index_col=0, parse_dates=True)
-#order: date, user
-
-#test how many IDs not included
-#print z.loc[z['cat'] == 0]
-
-#assigns the correct category to each row
-x['cat'] = x[1].apply(lambda ID: cats.loc[ID] if ID in cats.index else 0)
-y['cat'] = y[1].apply(lambda ID: cats.loc[ID] if ID in cats.index else 0)
-z['cat'] = z[1].apply(lambda ID: cats.loc[ID] if ID in cats.index else 0)
-
-#divides time series amongst categories, and counts number of people each day
-x1 = x.loc[x['cat'] == 1].drop('cat', axis=1)
-x1 = x1.groupby(x1.index).count()
-x2 = x.loc[x['cat'] == 2].drop('cat', axis=1)
-x2 = x2.groupby(x2.index).count()
-x3 = x.loc[x['cat'] == 3].drop('cat', axis=1)
-x3 = x3.groupby(x3.index).count()
-x4 = x.loc[x['cat'] == 4].drop('cat', axis=1)
-x4 = x4.groupby(x4.index).count()
-
-y1 = y.loc[y['cat'] == 1].drop('cat', axis=1)
-y1 = y1.groupby(y1.index).count()
-y2 = y.loc[y['cat'] == 2].drop('cat', axis=1)
-y2 = y2.groupby(y2.index).count()
-y3 = y.loc[y['cat'] == 3].drop('cat', axis=1)
-y3 = y3.groupby(y3.index).count()
-y4 = y.loc[y['cat'] == 4].drop('cat', axis=1)
-y4 = y4.groupby(y4.index).count()
-
-z1 = z.loc[z['cat'] == 1].drop('cat', axis=1)
-z1 = z1.groupby(z1.index).count()
-z2 = z.loc[z['cat'] == 2].drop('cat', axis=1)
-z2 = z2.groupby(z2.index).count()
-z3 = z.loc[z['cat'] == 3].drop('cat', axis=1)
-z3 = z3.groupby(z3.index).count()
-z4 = z.loc[z['cat'] == 4].drop('cat', axis=1)
-z4 = z4.groupby(z4.index).count()
+_instrument.rows(len(cats))
+
+#assigns the correct category to each row, and counts number of people of
+#each category each day (one column per category). files are order: date, user
+_instrument.step("load per user")
+logins = _data.loadCategoryCounts("loginsPerDayPerUser.csv", cats, CATEGORIES, CHUNKSIZE)
+calls = _data.loadCategoryCounts("callsPerDayPerUser.csv", cats, CATEGORIES, CHUNKSIZE)
+apps = _data.loadCategoryCounts("appsPerDayPerUser.csv", cats, CATEGORIES, CHUNKSIZE)
 
 
 #set index to the range between Jan 1 2011 - Feb 1 2013, since data may miss some days
+_instrument.step("weekly")
 newIndex = pd.date_range(start=datetime.datetime(2011, 1, 1), end=datetime.datetime(2013, 2, 1)).rename("Date")
-x1 = x1.reindex(newIndex)
-x2 = x2.reindex(newIndex)
-x3 = x3.reindex(newIndex)
-x4 = x4.reindex(newIndex)
-
-y1 = y1.reindex(newIndex)
-y2 = y2.reindex(newIndex)
-y3 = y3.reindex(newIndex)
-y4 = y4.reindex(newIndex)
-
-z1 = z1.reindex(newIndex)
-z2 = z2.reindex(newIndex)
-z3 = z3.reindex(newIndex)
-z4 = z4.reindex(newIndex)
-
-
-#convert to string, since stattools is unhappy with datetimes
-def finishConversion(q):
-	newIndex2 = pd.Index(data=[dt.strftime("%m/%d/%y") for dt in newIndex])
-	q = q.set_index(newIndex2)
-	q = pd.Series(data=q[1], index=q.index)
-	q = q.fillna(0)
-	return q
-
-x1 = finishConversion(x1)
-x2 = finishConversion(x2)
-x3 = finishConversion(x3)
-x4 = finishConversion(x4)
-
-y1 = finishConversion(y1)
-y2 = finishConversion(y2)
-y3 = finishConversion(y3)
-y4 = finishConversion(y4)
-
-z1 = finishConversion(z1)
-z2 = finishConversion(z2)
-z3 = finishConversion(z3)
-z4 = finishConversion(z4)
+logins = logins.reindex(newIndex).fillna(0)
+calls = calls.reindex(newIndex).fillna(0)
+apps = apps.reindex(newIndex).fillna(0)
 
-def convertToWeek(q):
-	newIndex = [q.index[i] for i in range (0, len(q.index), 7)]
+#sum into weeks
+logins = _data.resample(logins, 7)
+calls = _data.resample(calls, 7)
+apps = _data.resample(apps, 7)
+_instrument.rows(len(logins))
 
-	listX = [q[i:i+7] for i in range(0, len(q), 7)]
-	xWeekly = []
-	for week in listX:
-		val = week.sum()
-		xWeekly.append(val)
-	q = pd.Series(xWeekly, index=newIndex)
-	return q
 
-x1 = convertToWeek(x1)
-x2 = convertToWeek(x2)
-x3 = convertToWeek(x3)
-x4 = convertToWeek(x4)
 
-y1 = convertToWeek(y1)
-y2 = convertToWeek(y2)
-y3 = convertToWeek(y3)
-y4 = convertToWeek(y4)
 
-z1 = convertToWeek(z1)
-z2 = convertToWeek(z2)
-z3 = convertToWeek(z3)
-z4 = convertToWeek(z4)
 
 
 
 
-
-
-
-
-x = x4
-y = y4
-z = z4
+x = logins[CATEGORY]
+y = calls[CATEGORY]
+z = apps[CATEGORY]
 
 # ####################PRE-ANALYSIS####################
 #1. Augmented Dickey-Fuller test for unit root to test if stationary (if not,
 #take I(2) series, etc.).
-results = stattools.adfuller(x)
-print("ADF logins per day:")
-print("stat: "+str(results[0]))
-print("pval: "+str(results[1]))
-
-results = stattools.adfuller(y)
-print("ADF calls per day:")
-print("stat: "+str(results[0]))
-print("pval: "+str(results[1]))
-
-results = stattools.adfuller(z)
-print("ADF apps per day:")
-print("stat: "+str(results[0]))
-print("pval: "+str(results[1]))
+_instrument.step("adf")
+results = _math.adfBatch(np.vstack([x.values, y.values, z.values]))
+for name, row in zip(["logins", "calls", "apps"], results):
+	print("ADF "+name+" per day:")
+	print("stat: "+str(row["stat"]))
+	print("pval: "+str(row["pvalue"]))
 
 #2. Chi-Square for seasonality
-#group values by day
-def testChiSquare(series):
-	days = series.index.tolist()
-	vals = series.tolist()
-	data = zip(days, vals)
-	bins = [0 for i in range(7)]
-	for line in data:
-		bins[datetime.datetime.strptime(line[0], "%m/%d/%y").weekday()] += line[1]
-
-	exp = [sum(vals)/7 for i in range (7)]
-	print exp
-
-	chiSquare = 0
-	for i in range(7):
-		chiSquare += (bins[i] - exp[i])**2/exp[i]
-
-	print chiSquare
-	print scipy.stats.chi2.sf(chiSquare, 6)
-
-print("logins seasonality")
-testChiSquare(x)
-print("calls seasonality")
-testChiSquare(y)
-print("apps seasonality")
-testChiSquare(z)
+#group values by day of the week
+_instrument.step("seasonality")
+print("seasonality")
+print(tabulate(_math.seasonality(pd.concat([x, y, z], axis=1, keys=["logins", "calls", "apps"])), headers="keys"))
 
 ############COINTEGRATION TEST############
 #test to see if both series move in same general direction.
@@ -191,6 +98,7 @@ testChiSquare(z)
 #indicate that the series is cointegrate, while nonstationary means they
 #are not cointegrated.
 #x=logins, y-calls
+_instrument.step("cointegration")
 results = OLS(x.values, y.values).fit()
 print(results.params)
 print(results.pvalues)
@@ -203,34 +111,33 @@ print(resultsADF)
 ###############GRANGER TEST#################
 def grangerTest(exog, endog):
 	MAX_LAG = 30
-	ARaic = ar_model.AR(exog.tolist()).fit(maxlag=MAX_LAG, ic="aic")
-	ARbic = ar_model.AR(exog.tolist()).fit(maxlag=MAX_LAG, ic="bic")
-	#select the fewer number of parameters between both criteria.
-	numExog = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
+	#select the fewer number of lags between both criteria.
+	numExog = min(_math.selectOrder(exog.values, MAX_LAG))
 
 	print("Optimal number of lags for exog data is "+str(numExog))
 
-	ARaic = ar_model.AR(endog.tolist()).fit(maxlag=MAX_LAG, ic="aic")
-	ARbic = ar_model.AR(endog.tolist()).fit(maxlag=MAX_LAG, ic="bic")
-	#select the fewer number of parameters between both criteria.
-	numEndog = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
+	numEndog = min(_math.selectOrder(endog.values, MAX_LAG))
 
 	print("Optimal number of lags for endog data is "+str(numEndog))
 
-	#now that I know the optimal number of parameters, I can call the
-	#granger causality function of statsmodels.
-	data = pd.concat([endog, exog], axis=1)
+	#now that I know the optimal number of parameters, I can run the
+	#granger causality test for every lag up to it.
 	print("\nGranger causality results of indep onto dep")
-	results = stattools.grangercausalitytests(data, maxlag=numEndog)
+	results = _math.granger(endog.values, exog.values, numEndog)
+	print(results)
 
-	data = pd.concat([exog, endog], axis=1)
 	print("\nGranger causality results of dep onto indep")
-	results = stattools.grangercausalitytests(data, maxlag=numExog)
-	regr = results[2][1]
-	print(regr[0].params)
-	print(regr[1].params)
-	print(regr[1].pvalues)
+	results = _math.granger(exog.values, endog.values, numExog)
+	print(results)
 
+	#restricted and unrestricted regressions of dep onto indep at lag 2
+	dep, design = _math.lagMatrix(exog.values, endog.values, endogLags=2, exogLags=2, constant=True)
+	print(OLS(dep, design[:, :3]).fit().params)
+	regr = OLS(dep, design).fit()
+	print(regr.params)
+	print(regr.pvalues)
+
+_instrument.step("granger")
 print("indep = calls, dep = logins")
 grangerTest(y, x)
 
@@ -246,6 +153,53 @@ grangerTest(z, y)
 
 print("------------------\n\n\n")
 
+#test every metric and category against every other one. entry [row, col]
+#is the p-value of row granger causing col.
+_instrument.step("grangerPairs")
+allSeries = {}
+for name, metric in [("logins", logins), ("calls", calls), ("apps", apps)]:
+	for cat in metric.columns:
+		allSeries[name+str(cat)] = metric[cat]
+F, pvals = _math.grangerMatrix(allSeries, PAIR_LAG, path="grangerPairs.csv")
+print("Pairwise granger causality p-values")
+print(tabulate(pvals, headers="keys"))
+
+#and screen every pair for cointegration. entry [row, col] is the p-value of
+#the Engle-Granger test of row regressed on col.
+_instrument.step("cointegrationPairs")
+stats, pvals = _math.cointegrationMatrix(allSeries, path="cointegrationPairs.csv")
+print("Pairwise cointegration p-values")
+print(tabulate(pvals, headers="keys"))
+
+#the asymptotic F and chi2 p-values are shaky on ~110 weekly points, so test
+#indep onto dep of every pair and category against shifted surrogates of indep
+_instrument.step("surrogates")
+metrics = {"logins": logins, "calls": calls, "apps": apps}
+labels, endog, exog = [], [], []
+for cat in CATEGORIES:
+	for indep, dep in PAIRS:
+		labels.append(indep+" onto "+dep+" "+str(cat))
+		endog.append(metrics[dep][cat].values)
+		exog.append(metrics[indep][cat].values)
+F, pvals = _surrogate.grangerSignificance(endog, exog, PAIR_LAG, SURROGATES, seed=SEED, workers=WORKERS)
+R, ccPvals = _surrogate.crossCorrSignificance(endog, exog, PAIR_LAG, SURROGATES, seed=SEED, workers=WORKERS)
+significance = pd.DataFrame({"F": F, "F_pvalue": _math.grangerBatch(endog, exog, PAIR_LAG)[1],
+	"surrogate_pvalue": pvals}, index=labels, columns=["F", "F_pvalue", "surrogate_pvalue"])
+for lag in range(PAIR_LAG+1):
+	significance["R"+str(lag)+"_pvalue"] = ccPvals[:, lag]
+print("Surrogate significance of granger F and cross-correlations")
+print(tabulate(significance, headers="keys"))
+
+#the full battery (ADF, seasonality, cointegration and granger both ways) on
+#every category and pair of metrics at once, as one report table
+_instrument.step("battery")
+if PARALLEL:
+	report = _battery.runBattery(metrics, PAIRS, MAX_LAG, WORKERS)
+	report.to_csv("battery.csv")
+	print("Test battery of every category")
+	print(tabulate(report, headers="keys"))
+_instrument.step(None)
+
 
 
 
@@ -264,16 +218,16 @@ def plotxy(title, x, y):
 
 #plot all clusters for entire period
 # fig, (ax1, ax2, ax3, ax4) = plt.subplots(4, sharex=True)
-# ax1.plot(pd.to_datetime(z1.index), z1.values, color="orange")
+# ax1.plot(pd.to_datetime(apps[1].index), apps[1].values, color="orange")
 # ax1.grid()
 # ax1.set_title("Cluster 1")
-# ax2.plot(pd.to_datetime(z2.index), z2.values, color="orange")
+# ax2.plot(pd.to_datetime(apps[2].index), apps[2].values, color="orange")
 # ax2.grid()
 # ax2.set_title("Cluster 2")
-# ax3.plot(pd.to_datetime(z3.index), z3.values, color="orange")
+# ax3.plot(pd.to_datetime(apps[3].index), apps[3].values, color="orange")
 # ax3.grid()
 # ax3.set_title("Cluster 3")
-# ax4.plot(pd.to_datetime(z4.index), z4.values, color="orange")
+# ax4.plot(pd.to_datetime(apps[4].index), apps[4].values, color="orange")
 # ax4.grid()
 # ax4.set_title("Cluster 4")
 # fig.suptitle("Aggregate Weekly Appointments by Cluster, 2011-Feb. 2013")
@@ -281,7 +235,7 @@ def plotxy(title, x, y):
 
 
 
-# ax4.plot(pd.to_datetime(pd.rolling_mean(x4,20).index), pd.rolling_mean(x4,20).values, color="blue")
+# ax4.plot(pd.to_datetime(pd.rolling_mean(logins[4],20).index), pd.rolling_mean(logins[4],20).values, color="blue")
 
 
 
@@ -0,0 +1,216 @@
+import os
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+import _math
+
+"""
+Writes a synthetic patient portal dataset with the files and layouts every
+script reads, so they can be run and load tested without the real data:
+
+	patientCategories.csv                  ID, category (no header)
+	loginsPerDayPerUser.csv, callsPerDayPerUser.csv, appsPerDayPerUser.csv
+	                                       date, user ID per event (no header)
+	loginsPerDay.csv, callsPerDay.csv, appsPerDay.csv
+	                                       date, count (no header), the daily
+	                                       totals of the per user files
+	clicksPerDay.csv, encountersPerDay.csv date, count_clicks / count_encounter
+	sessionsPerMonth.csv, encountersPerMonth.csv
+	                                       ID then one column per month, one
+	                                       row per patient
+
+Every metric follows one latent daily driver (an AR(1) process) with a
+weekday pattern and a linear trend, and the relations below are planted so
+that the tests should find them: logins lead calls by LEAD days and apps by
+2*LEAD days, clicks lead encounters by LEAD days, and each patient's monthly
+encounters depend on their sessions of the month before.
+
+The per user and monthly files are written in chunks of days (or patients)
+by a process pool, each chunk to its own part file which are then joined in
+order, so the dataset is never held in memory. Chunks are seeded from one
+seed, so the output does not depend on the number of workers.
+
+	python generateData.py --out data --patients 1000000 --workers 8
+"""
+
+####################CONSTANTS###################
+START = "2010-12-01"
+END = "2013-02-28"
+PATIENTS = 100000
+#share of patients in each category (1, 2, ...) and how active each is
+MIX = [0.4, 0.3, 0.2, 0.1]
+ACTIVITY = [0.5, 1.0, 1.5, 3.0]
+#relative activity Monday..Sunday, scaled by the seasonality amplitude
+WEEKDAY = np.array([1.15, 1.1, 1.05, 1.0, 0.95, 0.45, 0.3])
+SEASONALITY = 1.0
+#relative growth over the whole period
+TREND = 0.5
+#days by which each planted relation lags, and the driver's strength
+LEAD = 3
+STRENGTH = 0.3
+#events per patient per day of every metric with per user files, and the
+#days by which it lags the driver
+PER_USER = [("logins", 0.05, 0), ("calls", 0.01, LEAD), ("apps", 0.005, 2*LEAD)]
+#aggregate only daily metrics: name, file column, events per day and lag
+DAILY = [("clicks", "count_clicks", 5000.0, 0), ("encounters", "count_encounter", 800.0, LEAD)]
+#mean sessions per patient per month, encounters per session of the month
+#before, and share of patients in each monthly file
+SESSIONS = 1.5
+COUPLING = 0.2
+MONTHLY_SHARE = 0.95
+#days and patients written per chunk
+CHUNK_DAYS = 30
+CHUNK_PATIENTS = 100000
+SEED = 0
+
+
+
+def driver(days, rng, lag=0, phi=0.9):
+	"""
+	The latent daily activity of every day plus `lag` days before the
+	first: an AR(1) process scaled to unit variance.
+	"""
+	shocks = rng.standard_normal(days + lag + 200)
+	values = np.empty(len(shocks))
+	values[0] = shocks[0]
+	for t in range(1, len(shocks)):
+		values[t] = phi*values[t-1] + shocks[t]
+	return values[200:] * np.sqrt(1 - phi**2)
+
+
+def rates(dates, latent, base, lag):
+	"""
+	Expected daily counts of a metric with the given base rate that lags
+	the latent driver (which starts max lag days early) by lag days.
+	"""
+	maxLag = len(latent) - len(dates)
+	season = 1 + SEASONALITY*(WEEKDAY[dates.weekday] - 1)
+	trend = 1 + TREND*np.arange(len(dates)) / float(len(dates))
+	shifted = latent[maxLag-lag:maxLag-lag+len(dates)]
+	return base * season * trend * np.exp(STRENGTH*shifted - STRENGTH**2/2)
+
+
+def _join(path, parts, header=None):
+	#append the part files to path in order, deleting them
+	with open(path, "w") as out:
+		if header is not None:
+			out.write(header)
+		for part in parts:
+			with open(part) as f:
+				shutil.copyfileobj(f, out)
+			os.remove(part)
+
+
+def _perUserChunk(task, shared):
+	"""Writes the (date, user) rows of one metric over a chunk of days."""
+	name, first, last, seed, part = task
+	rng = np.random.default_rng(seed)
+	counts = shared["counts"][name][first:last]
+	dates = shared["dates"][first:last]
+	users, days = [], []
+	for c, members in enumerate(shared["members"]):
+		total = counts[:, c].sum()
+		users.append(members[rng.integers(0, len(members), total)])
+		days.append(np.repeat(np.arange(len(dates)), counts[:, c]))
+	users = np.concatenate(users)
+	days = np.concatenate(days)
+	order = np.argsort(days, kind="stable")
+	rows = pd.DataFrame({"date": dates[days[order]].strftime("%Y-%m-%d"), "user": users[order]})
+	rows.to_csv(part, header=False, index=False)
+	return part
+
+
+def _monthlyChunk(task, shared):
+	"""Writes the sessions and encounters rows of a chunk of patients."""
+	first, last, seed, parts = task
+	rng = np.random.default_rng(seed)
+	ids = shared["ids"][first:last]
+	factor = shared["monthFactor"]
+	propensity = rng.gamma(0.5, 2.0, (len(ids), 1)) * np.asarray(ACTIVITY)[shared["categories"][first:last] - 1][:, None]
+	sessions = rng.poisson(SESSIONS * propensity * factor)
+	previous = np.column_stack([np.zeros(len(ids)), sessions[:, :-1]])
+	encounters = rng.poisson(0.3 * propensity * factor + COUPLING * previous)
+	for values, part in zip([sessions, encounters], parts):
+		keep = rng.random(len(ids)) < MONTHLY_SHARE
+		frame = pd.DataFrame(values[keep], index=ids[keep])
+		frame.to_csv(part, header=False)
+	return parts
+
+
+def generate(out, patients=PATIENTS, start=START, end=END, seed=SEED, workers=None,
+		chunkDays=CHUNK_DAYS, chunkPatients=CHUNK_PATIENTS):
+	"""Writes every file of the dataset to the directory out."""
+	if not os.path.isdir(out):
+		os.makedirs(out)
+	dates = pd.date_range(start, end)
+	#every chunk gets its own child of the seed, spawned in a fixed order
+	seeds = np.random.SeedSequence(seed)
+	rng = np.random.default_rng(seeds.spawn(1)[0])
+	maxLag = max([lag for _, _, lag in PER_USER] + [lag for _, _, _, lag in DAILY])
+	latent = driver(len(dates), rng, maxLag)
+
+	#patients and their categories
+	ids = np.arange(100000, 100000 + patients)
+	categories = rng.choice(len(MIX), patients, p=np.asarray(MIX)/np.sum(MIX)) + 1
+	pd.DataFrame({"ID": ids, "category": categories}).to_csv(
+		os.path.join(out, "patientCategories.csv"), header=False, index=False)
+	members = [ids[categories == c] for c in range(1, len(MIX)+1)]
+
+	#daily counts of every per user metric and category, from which both the
+	#per user rows and the daily totals are written
+	counts = {}
+	for name, base, lag in PER_USER:
+		expected = np.column_stack([rates(dates, latent, base*len(m)*a, lag) for m, a in zip(members, ACTIVITY)])
+		counts[name] = rng.poisson(expected)
+		pd.Series(counts[name].sum(axis=1), index=dates.strftime("%Y-%m-%d")).to_csv(
+			os.path.join(out, name+"PerDay.csv"), header=False)
+
+	for name, column, base, lag in DAILY:
+		frame = pd.DataFrame({column: rng.poisson(rates(dates, latent, base, lag))},
+			index=pd.Index(dates.strftime("%Y-%m-%d"), name="date"))
+		frame.to_csv(os.path.join(out, name+"PerDay.csv"))
+
+	#monthly activity relative to the average month
+	months = pd.period_range(dates[0], dates[-1], freq="M")
+	daily = pd.Series(rates(dates, latent, 1.0, 0), index=dates)
+	monthFactor = daily.groupby(dates.to_period("M")).mean().reindex(months).values
+	monthFactor = monthFactor / monthFactor.mean()
+
+	shared = {"dates": dates, "counts": counts, "members": members, "ids": ids,
+		"categories": categories, "monthFactor": monthFactor}
+	tasks = []
+	for name, base, lag in PER_USER:
+		path = os.path.join(out, name+"PerDayPerUser.csv")
+		for first in range(0, len(dates), chunkDays):
+			tasks.append((name, first, first+chunkDays, seeds.spawn(1)[0], path+".part%05d" % first))
+	for first in range(0, patients, chunkPatients):
+		tasks.append((first, first+chunkPatients, seeds.spawn(1)[0],
+			[os.path.join(out, name+"PerMonth.csv.part%09d" % first) for name in ["sessions", "encounters"]]))
+	parts = _math._runPool(_chunk, tasks, shared, workers)
+
+	for name, base, lag in PER_USER:
+		path = os.path.join(out, name+"PerDayPerUser.csv")
+		_join(path, [part for part in parts if isinstance(part, str) and part.startswith(path+".part")])
+	header = "ID," + ",".join(str(month) for month in months) + "\n"
+	for i, name in enumerate(["sessions", "encounters"]):
+		_join(os.path.join(out, name+"PerMonth.csv"), [part[i] for part in parts if not isinstance(part, str)], header)
+
+
+
+def _chunk(task, shared):
+	#tasks of per user files have five fields, those of monthly files four
+	return _perUserChunk(task, shared) if len(task) == 5 else _monthlyChunk(task, shared)
+
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Writes a synthetic patient portal dataset.")
+	parser.add_argument("--out", default=".", help="directory to write the files to")
+	parser.add_argument("--patients", type=int, default=PATIENTS)
+	parser.add_argument("--start", default=START)
+	parser.add_argument("--end", default=END)
+	parser.add_argument("--seed", type=int, default=SEED)
+	parser.add_argument("--workers", type=int, default=None, help="processes to use (all cores by default)")
+	args = parser.parse_args()
+	generate(args.out, args.patients, args.start, args.end, args.seed, args.workers)
@@ -11,9 +11,18 @@ from statsmodels.tsa import arima_model
 from statsmodels.stats import diagnostic
 import statsmodels
 import _math
+import _data
+import _instrument
 
 """
 Eric Salina
+
+Parity check of _math.ljungBoxBatch against the single series implementations.
+
+_math.ljungBox (fed a PACF) and _math.ljungBox2 (raw series, ACF) never agreed
+because they are different statistics: the first builds Q from partial
+autocorrelations, the second from autocorrelations. ljungBoxBatch computes
+either one, selected by its `statistic` argument, so both are checked here.
 """
 
 ####################CONSTANTS###################
@@ -21,48 +30,57 @@ MAX_LAG = 30
 
 
 ####################LOAD DATA###################
-clicksPerDay = pd.read_csv("clicksPerDay.csv", header=0, index_col=0, parse_dates=True)
-encountersPerDay = pd.read_csv("encountersPerDay.csv", header=0, index_col=0, parse_dates=True)
-
 #set index to the range between Jan 1 2011 - Dec 31 2012, since data may miss any day
-#without any clicks or encounters (though not likely).
-newIndex = pd.date_range(start=datetime.datetime(2011, 1, 1), end=datetime.datetime(2012, 12, 1)).rename("Date")
-clicksPerDay = clicksPerDay.reindex(newIndex)
-encountersPerDay = encountersPerDay.reindex(newIndex)
+#without any clicks or encounters (though not likely), carrying values forward.
+_instrument.step("load data")
+start = datetime.datetime(2011, 1, 1)
+end = datetime.datetime(2012, 12, 1)
+clicksPerDay = _data.loadDaily("clicksPerDay.csv", "count_clicks", start, end)
+encountersPerDay = _data.loadDaily("encountersPerDay.csv", "count_encounter", start, end)
+
+series = np.vstack([clicksPerDay.values, encountersPerDay.values])
+n = series.shape[1]
 
-#convert to string, since stattools is unhappy with datetimes
-newIndex = pd.Index(data=[dt.strftime("%m/%d/%y") for dt in newIndex])
-clicksPerDay = clicksPerDay.set_index(newIndex)
-encountersPerDay = encountersPerDay.set_index(newIndex)
 
-#clicksPerDay.index.name = None
-#encountersPerDay.index.name = None
 
-clicksPerDay = pd.Series(data=clicksPerDay["count_clicks"], index=clicksPerDay.index)
-encountersPerDay = pd.Series(data=encountersPerDay["count_encounter"], index=encountersPerDay.index)
+####################ACF STATISTIC####################
+#batched implementation, both series in one pass
+_instrument.step("acf ljungBox")
+batch = _math.ljungBoxBatch(series, MAX_LAG, statistic="acf")
 
-clicksPerDay = clicksPerDay.fillna(method="ffill")
-encountersPerDay = encountersPerDay.fillna(method="ffill")
+for row, ts in zip(batch, [clicksPerDay, encountersPerDay]):
+	#statsmodels implementation
+	results = diagnostic.acorr_ljungbox(ts.values, lags=MAX_LAG)
+	if isinstance(results, pd.DataFrame):
+		results = (results["lb_stat"].values, results["lb_pvalue"].values)
+	np.testing.assert_allclose(row["Q"][1:], results[0])
+	np.testing.assert_allclose(row["p"][1:], results[1])
 
+	#single series implementation
+	results = _math.ljungBox2(ts, maxlag=MAX_LAG)
+	np.testing.assert_allclose(row["Q"][1:], results[0])
+	np.testing.assert_allclose(row["p"][1:], results[1])
 
+print("ACF Ljung-Box matches acorr_ljungbox and ljungBox2")
 
-####################LJUNG-BOX####################
-clicksPACF = stattools.pacf_ols(clicksPerDay, nlags=MAX_LAG)
-encountersPACF = stattools.pacf_ols(encountersPerDay, nlags=MAX_LAG)
 
-#my implementation
-results = _math.ljungBox(encountersPACF, len(encountersPerDay), MAX_LAG)
-lag, R, Q, p = zip(*results)
-print np.asarray(Q[1:])
-print np.asarray(p[1:])
 
-#statsmodels implementation
-results = diagnostic.acorr_ljungbox(encountersPerDay, lags=MAX_LAG)
-print results
+####################PACF STATISTIC####################
+_instrument.step("pacf ljungBox")
+batch = _math.ljungBoxBatch(series, MAX_LAG, statistic="pacf")
 
-#my copy of the statsmodels implementation
-results = _math.ljungBox2(encountersPerDay, maxlag=MAX_LAG)
-print results
+for row, ts in zip(batch, [clicksPerDay, encountersPerDay]):
+	PACF = stattools.pacf(ts.values, nlags=MAX_LAG, method="ldb")
+	results = _math.ljungBox(PACF, n, MAX_LAG)
+	np.testing.assert_allclose(row["Q"], results["Q"])
+	np.testing.assert_allclose(row["p"], results["p"])
 
+print("PACF Ljung-Box matches ljungBox")
 
-#they are not the same... I wonder why.
\ No newline at end of file
+#the scripts estimate the PACF with pacf_ols instead, which drifts from the
+#Yule-Walker estimate as the lags grow
+PACF = stattools.pacf_ols(encountersPerDay.values, nlags=MAX_LAG)
+results = _math.ljungBox(PACF, n, MAX_LAG)
+print(tabulate(np.column_stack([results["lag"], batch[1]["Q"], results["Q"]]),
+	headers=["lag", "Q (Yule-Walker PACF)", "Q (OLS PACF)"]))
+_instrument.step(None)
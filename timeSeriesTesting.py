@@ -8,6 +8,8 @@ from statsmodels.tsa import ar_model
 from statsmodels.tsa import arima_model
 from tabulate import tabulate
 import _math
+import _panel
+import _instrument
 
 """
 Eric Salina
@@ -28,10 +30,9 @@ Next I follow roughly the steps outlined by Dave Giles on his blog at:
 http://davegiles.blogspot.com/2011/04/testing-for-granger-causality.html
 for conducting the Granger causality test.
 
-First, I must determine the appropriate lag for each AR model. Because this
-would be difficult to compute alone, I use the SciPy AR model fit function,
-which allows me to specify which criterion I would like to use and
-returns an AR model with the appropriate number of lags.
+First, I must determine the appropriate lag for each AR model. I use
+_math.selectOrder, which fits every AR order up to a maximum at once and
+returns the number of lags preferred by both the AIC and BIC criteria.
 
 I then use these numbers of lags to introduce the appriopriate number of lags
 as exogenous variables in a new AR model for each time series.
@@ -40,30 +41,44 @@ With these new time series, I test whether the added parameters are
 significantly different from zero by using an F-test. If any are, then
 there is evidence for correlation, or "granger causality" between from on
 time series unto the other.
-These final steps I simplify by implementing the statsmodels function for
-Granger Causality
+These final steps are carried out by _math.granger, which fits the restricted
+and unrestricted models for every lag from one QR factorization.
 
 """
 
 
-####################LOAD DATA###################
-sessionsPerMonth = pd.read_csv("sessionsPerMonth.csv", index_col=0).dropna(axis=1)
-encountersPerMonth = pd.read_csv("encountersPerMonth.csv", index_col=0).dropna(axis=1)
+####################CONSTANTS###################
+#patients of the monthly files read at a time, or None to read them whole
+CHUNKSIZE = 100000
+#file of ID, cohort rows to also run the granger test on each cohort's
+#activity, or None to only test the sum of all patients
+COHORTS = None
+#lag of the per patient granger tests, and their false discovery rate
+PATIENT_LAG = 2
+#largest AR order considered when selecting the lags of the monthly totals
+MAX_LAG = 20
+ALPHA = 0.05
 
-sessIndex = sessionsPerMonth.index
-encIndex = encountersPerMonth.index
 
-#only take patients which are in both datasets
-sessionsPerMonth = sessionsPerMonth.reindex(encIndex)
-encountersPerMonth = encountersPerMonth.reindex(sessIndex)
+####################LOAD DATA###################
+#sparse (patient x month) panels, without the months missing any values.
+#_instrument.step times the script one step at a time when INSTRUMENT is set
+_instrument.step("load panels")
+sessions = _panel.readPanel("sessionsPerMonth.csv", CHUNKSIZE)
+encounters = _panel.readPanel("encountersPerMonth.csv", CHUNKSIZE)
 
-#give same index:
-sessionsPerMonth = sessionsPerMonth.reindex(sessIndex).dropna()
-encountersPerMonth = encountersPerMonth.reindex(sessIndex).dropna()
+#only take patients which are in both datasets
+_instrument.step("intersect")
+sessions, encounters = sessions.intersect(encounters)
+_instrument.rows(len(sessions))
 
 #PERFORM ANALYSIS ON SUM OF ALL USER ACTIVITY PER MONTH
-sessionsPerMonth = sessionsPerMonth.sum(axis=0)
-encountersPerMonth = encountersPerMonth.sum(axis=0)
+_instrument.step("monthly totals")
+sessionsPerMonth = sessions.total()
+encountersPerMonth = encounters.total()
+#there are only a couple dozen months, so the order is capped at what the
+#unrestricted granger model (constant and both series' lags) can be fitted on
+maxLag = min(MAX_LAG, (len(sessionsPerMonth) - 2) // 3)
 
 
 
@@ -83,6 +98,7 @@ encountersPerMonth = encountersPerMonth.sum(axis=0)
 
 #3. calculate partial autocorrelation function (PACF) w/ Ljung-Box test to see
 #which lags help predict current values.
+_instrument.step("pacf")
 sessionsPACF = stattools.pacf_ols(sessionsPerMonth, nlags=6)
 encountersPACF = stattools.pacf_ols(encountersPerMonth, nlags=6)
 
@@ -103,6 +119,7 @@ def plotxy(title, x, y, LSRL=None):
 	fig.autofmt_xdate()
 	plt.show()
 
+_instrument.step(None)
 plotxy("sessions", range(7), sessionsPACF)
 plotxy("encounters", range(7), encountersPACF)
 
@@ -118,6 +135,7 @@ Note: first var is dependent, second is independent, which is unclear from
 documentation
 """
 
+_instrument.step("ccf")
 sessionsCCF = _math.cc_ols(sessionsPerMonth, encountersPerMonth, 6)
 encountersCCF = _math.cc_ols(encountersPerMonth, sessionsPerMonth, 6)
 
@@ -136,31 +154,59 @@ print(tabulate(encountersCCF_LJ, headers=["lag", "R", "Q", "p-val"]))
 
 ####################ANALYSIS####################
 #1. select appriopriate number of lags
-ARaic = ar_model.AR(sessionsPerMonth.tolist()).fit(maxlag=20, ic="aic")
-ARbic = ar_model.AR(sessionsPerMonth.tolist()).fit(maxlag=20, ic="bic")
-#select the fewer number of parameters between both criteria.
-numLagsSess = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
+#select the fewer number of lags between both criteria.
+_instrument.step("granger")
+numLagsSess = min(_math.selectOrder(sessionsPerMonth.values, maxLag))
 
 print("Optimal number of lags for session data is "+str(numLagsSess))
 
-ARaic = ar_model.AR(encountersPerMonth.tolist()).fit(maxlag=20, ic="aic")
-ARbic = ar_model.AR(encountersPerMonth.tolist()).fit(maxlag=20, ic="bic")
-#select the fewer number of parameters between both criteria.
-numLagsEnc = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
+#select the fewer number of lags between both criteria.
+numLagsEnc = min(_math.selectOrder(encountersPerMonth.values, maxLag))
 
 print("Optimal number of lags for encounter data is "+str(numLagsEnc))
 
 
-#2. now that I know the optimal number of parameters, I can call the
-#granger causality function of statsmodels.
-data = pd.concat([encountersPerMonth, sessionsPerMonth], axis=1)
+#2. now that I know the optimal number of parameters, I can run the
+#granger causality test for every lag up to it.
 print("\nGranger causality results of sessions onto encounters")
-results = stattools.grangercausalitytests(data, maxlag=numLagsEnc)
+results = _math.granger(encountersPerMonth.values, sessionsPerMonth.values, numLagsEnc)
+print(results)
 
-data = pd.concat([sessionsPerMonth, encountersPerMonth], axis=1)
 print("\nGranger causality results of encounters onto sessions")
-results = stattools.grangercausalitytests(data, maxlag=numLagsSess)
-
-#ideally, I would implement this myself, however statsmodels is buggy and
-#does not deal with exogenous variables well, meaning I would have to
-#implement an AR fitting algorithm, which is non-ideal.
\ No newline at end of file
+results = _math.granger(sessionsPerMonth.values, encountersPerMonth.values, numLagsSess)
+print(results)
+
+#_math.granger fits both the restricted and unrestricted models by OLS, so
+#it does not depend on statsmodels' AR handling of exogenous variables.
+
+
+####################PER PATIENT####################
+#the same test on every patient's own sessions and encounters
+_instrument.step("granger by patient")
+results = _panel.granger(encounters, sessions, PATIENT_LAG, ALPHA)
+_instrument.rows(len(results))
+results.to_csv("grangerByPatient.csv")
+tested = results["pvalue"].notnull()
+print("\nPer patient granger causality of sessions onto encounters at lag "+str(PATIENT_LAG))
+print("patients tested: "+str(tested.sum())+" of "+str(len(results)))
+print("significant at "+str(ALPHA)+" before correction: "+str((results["pvalue"][tested] < ALPHA).sum()))
+print("significant after FDR correction: "+str(results["significant"].sum()))
+print(results[results["significant"]].sort_values("qvalue").head(20))
+
+
+####################COHORTS####################
+#the same test on the summed activity of each cohort of patients
+_instrument.step("cohorts")
+if COHORTS is not None:
+	cohorts = pd.read_csv(COHORTS, header=None, index_col=0).iloc[:,0]
+	sessionsByCohort = sessions.cohortSums(cohorts)
+	encountersByCohort = encounters.cohortSums(cohorts)
+	for cohort in sessionsByCohort.index:
+		sess = sessionsByCohort.loc[cohort].values
+		enc = encountersByCohort.loc[cohort].values
+		print("\nCohort "+str(cohort))
+		print("Granger causality results of sessions onto encounters")
+		print(_math.granger(enc, sess, min(_math.selectOrder(enc, maxLag))))
+		print("Granger causality results of encounters onto sessions")
+		print(_math.granger(sess, enc, min(_math.selectOrder(sess, maxLag))))
+_instrument.step(None)
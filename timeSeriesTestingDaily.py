@@ -12,6 +12,9 @@ from statsmodels.stats import diagnostic
 from statsmodels.regression.linear_model import OLS
 import statsmodels
 import _math
+import _data
+import _rolling
+import _instrument
 
 """
 Eric Salina
@@ -32,10 +35,9 @@ Next I follow roughly the steps outlined by Dave Giles on his blog at:
 http://davegiles.blogspot.com/2011/04/testing-for-granger-causality.html
 for conducting the Granger causality test.
 
-First, I must determine the appropriate lag for each AR model. Because this
-would be difficult to compute alone, I use the SciPy AR model fit function,
-which allows me to specify which criterion I would like to use and
-returns an AR model with the appropriate number of lags.
+First, I must determine the appropriate lag for each AR model. I use
+_math.selectOrder, which fits every AR order up to a maximum at once and
+returns the number of lags preferred by both the AIC and BIC criteria.
 
 I then use these numbers of lags to introduce the appriopriate number of lags
 as exogenous variables in a new AR model for each time series.
@@ -44,58 +46,36 @@ With these new time series, I test whether the added parameters are
 significantly different from zero by using an F-test. If any are, then
 there is evidence for correlation, or "granger causality" between from on
 time series unto the other.
-These final steps I simplify by implementing the statsmodels function for
-Granger Causality
+These final steps are carried out by _math.granger, which fits the restricted
+and unrestricted models for every lag from one QR factorization.
 
 """
 
 ####################CONSTANTS###################
 MAX_LAG = 30
+#weeks in each window of the rolling tests, and their lag
+WINDOW = 52
+ROLLING_LAG = 2
 
 
 ####################LOAD DATA###################
-clicksPerDay = pd.read_csv("clicksPerDay.csv", header=0, index_col=0, parse_dates=True)
-encountersPerDay = pd.read_csv("encountersPerDay.csv", header=0, index_col=0, parse_dates=True)
-
 #set index to the range between Jan 1 2011 - Dec 31 2012, since data may miss any day
-#without any clicks or encounters (though not likely).
-newIndex = pd.date_range(start=datetime.datetime(2011, 1, 1), end=datetime.datetime(2012, 12, 1)).rename("Date")
-clicksPerDay = clicksPerDay.reindex(newIndex)
-encountersPerDay = encountersPerDay.reindex(newIndex)
-
-#convert to string, since stattools is unhappy with datetimes
-newIndex = pd.Index(data=[dt.strftime("%m/%d/%y") for dt in newIndex])
-clicksPerDay = clicksPerDay.set_index(newIndex)
-encountersPerDay = encountersPerDay.set_index(newIndex)
-
-clicksPerDay = pd.Series(data=clicksPerDay["count_clicks"], index=clicksPerDay.index)
-encountersPerDay = pd.Series(data=encountersPerDay["count_encounter"], index=encountersPerDay.index)
-
-clicksPerDay = clicksPerDay.fillna(method="ffill")
-encountersPerDay = encountersPerDay.fillna(method="ffill")
+#without any clicks or encounters (though not likely), carrying values forward.
+_instrument.step("load data")
+start = datetime.datetime(2011, 1, 1)
+end = datetime.datetime(2012, 12, 1)
+clicksPerDay = _data.loadDaily("clicksPerDay.csv", "count_clicks", start, end)
+encountersPerDay = _data.loadDaily("encountersPerDay.csv", "count_encounter", start, end)
 
 #clicksPerDay = clicksPerDay.diff()[1:]
 #encountersPerDay = encountersPerDay.diff()[1:]
 
 
-listClicks = [clicksPerDay[i:i+7] for i in range(0, len(clicksPerDay), 7)]
-clicksPerWeekVals = []
-
-for clicks in listClicks:
-	val = clicks.sum()
-	clicksPerWeekVals.append(val)
-
-listEncs = [encountersPerDay[i:i+7] for i in range(0, len(encountersPerDay), 7)]
-encsPerWeekVals = []
-
-for enc in listEncs:
-	val = enc.sum()
-	encsPerWeekVals.append(val)
-
-
 ##TODO: CHANGE TO NEW FILE AND CHANGE NAMES TO 'WEEK,' NOT 'DAY.'
-clicksPerDay = pd.Series(clicksPerWeekVals)
-encountersPerDay = pd.Series(encsPerWeekVals)
+_instrument.step("weekly")
+clicksPerDay = _data.resample(clicksPerDay, 7)
+encountersPerDay = _data.resample(encountersPerDay, 7)
+_instrument.rows(len(encountersPerDay))
 
 
 
@@ -112,8 +92,9 @@ encountersPerDay = pd.Series(encsPerWeekVals)
 
 #3. calculate partial autocorrelation function (PACF) w/ Ljung-Box test to see
 #which lags help predict current values.
-clicksPACF = stattools.pacf_ols(clicksPerDay, nlags=MAX_LAG)
-encountersPACF = stattools.pacf_ols(encountersPerDay, nlags=MAX_LAG)
+_instrument.step("pacf")
+clicksPACF = stattools.pacf_ols(clicksPerDay.values, nlags=MAX_LAG)
+encountersPACF = stattools.pacf_ols(encountersPerDay.values, nlags=MAX_LAG)
 
 #Ljung-Box test
 clicksPACF_LJ = _math.ljungBox(clicksPACF, len(clicksPerDay), MAX_LAG)
@@ -132,6 +113,7 @@ def plotxy(title, x, y, LSRL=None):
 	fig.autofmt_xdate()
 	plt.show()
 
+_instrument.step(None)
 plotxy("clicks", range(MAX_LAG+1), clicksPACF)
 plotxy("encounters", range(MAX_LAG+1), encountersPACF)
 
@@ -146,9 +128,10 @@ clicksCCF = stattools.ccf(clicksPerDay, encountersPerMont)
 Note: first var is dependent, second is independent, which is unclear from 
 documentation
 """
-print len(encountersPerDay)
-print len(clicksPerDay)
+print(len(encountersPerDay))
+print(len(clicksPerDay))
 
+_instrument.step("ccf")
 clicksCCF = _math.cc_ols(clicksPerDay, encountersPerDay, MAX_LAG)
 encountersCCF = _math.cc_ols(encountersPerDay, clicksPerDay, MAX_LAG)
 
@@ -167,57 +150,47 @@ print(tabulate(encountersCCF_LJ, headers=["lag", "R", "Q", "p-val"]))
 
 ####################ANALYSIS####################
 #1. select appriopriate number of lags
-ARaic = ar_model.AR(clicksPerDay.tolist()).fit(maxlag=MAX_LAG, ic="aic")
-ARbic = ar_model.AR(clicksPerDay.tolist()).fit(maxlag=MAX_LAG, ic="bic")
-#select the fewer number of parameters between both criteria.
-numLagsclick = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
+#select the fewer number of lags between both criteria.
+_instrument.step("granger")
+numLagsclick = min(_math.selectOrder(clicksPerDay.values, MAX_LAG))
 
 print("Optimal number of lags for click data is "+str(numLagsclick))
 
-ARaic = ar_model.AR(encountersPerDay.tolist()).fit(maxlag=MAX_LAG, ic="aic")
-ARbic = ar_model.AR(encountersPerDay.tolist()).fit(maxlag=MAX_LAG, ic="bic")
-#select the fewer number of parameters between both criteria.
-numLagsEnc = len(ARaic.params) if len(ARaic.params) < len(ARbic.params) else len(ARbic.params)
+#select the fewer number of lags between both criteria.
+numLagsEnc = min(_math.selectOrder(encountersPerDay.values, MAX_LAG))
 
 print("Optimal number of lags for encounter data is "+str(numLagsEnc))
 
 
-#2. now that I know the optimal number of parameters, I can call the
-#granger causality function of statsmodels.
-data = pd.concat([encountersPerDay, clicksPerDay], axis=1)
+#2. now that I know the optimal number of parameters, I can run the
+#granger causality test for every lag up to it.
 print("\nGranger causality results of clicks onto encounters")
-results = stattools.grangercausalitytests(data, maxlag=numLagsEnc)
+results = _math.granger(encountersPerDay.values, clicksPerDay.values, numLagsEnc)
+print(results)
 
-data = pd.concat([clicksPerDay, encountersPerDay], axis=1)
 print("\nGranger causality results of encounters onto clicks")
-results = stattools.grangercausalitytests(data, maxlag=numLagsclick)
+results = _math.granger(clicksPerDay.values, encountersPerDay.values, numLagsclick)
+print(results)
 
-#ideally, I would implement this myself, however statsmodels is buggy and
-#does not deal with exogenous variables well, meaning I would have to
-#implement an AR fitting algorithm, which is non-ideal.
+#_math.granger fits both the restricted and unrestricted models by OLS, so
+#it does not depend on statsmodels' AR handling of exogenous variables.
 
+#3. whether the effect changed over time: the same test, and the cross-
+#correlations, over a window sliding one week at a time
+_instrument.step("rolling")
+print("\nRolling granger causality results of clicks onto encounters")
+print(_rolling.rollingGranger(encountersPerDay, clicksPerDay, ROLLING_LAG, WINDOW))
+print("\nRolling cross-correlation of encounters with lagged clicks")
+print(_rolling.rollingCrossCorr(encountersPerDay, clicksPerDay, ROLLING_LAG, WINDOW))
 
 
-MAX_LAG = 3
-
-endog = encountersPerDay.tolist()
-exog = clicksPerDay.tolist()
 
-endogLags = []
-exogLags = []
-
-for lag in range(0, MAX_LAG+1):
-	end = -(MAX_LAG-lag) if -(MAX_LAG-lag) != 0 else len(endog)
-	laggedEndog = endog[lag:end]
-	endogLags.append(laggedEndog)
-	laggedExog = exog[lag:end]
-	exogLags.append(laggedExog)
-
-endogLags.reverse()
-exogLags.reverse()
+_instrument.step("lagged regression")
+MAX_LAG = 3
 
-endog = endogLags.pop(0)
-exog = exogLags.pop(0)
+endog, exog = _math.lagMatrix(encountersPerDay.values, clicksPerDay.values,
+	endogLags=MAX_LAG, exogLags=MAX_LAG, constant=True)
 
 results = OLS(endog, exog=exog).fit()
-print results.params
\ No newline at end of file
+print(results.params)
+_instrument.step(None)
@@ -0,0 +1,81 @@
+import os
+import sys
+import datetime
+import pandas as pd
+from tabulate import tabulate
+import _data
+import _online
+import _instrument
+
+"""
+Nightly refresh of the daily clicks and encounters statistics.
+
+The first run builds the running statistics (_online.OnlineStats) from the
+full history. Every later run only adds the days of the files given on the
+command line, in the same format as clicksPerDay.csv and
+encountersPerDay.csv, e.g.
+
+	python updateDaily.py newClicks.csv newEncounters.csv
+
+and reports the Ljung-Box, cross-correlation, Granger and seasonality tests
+from the updated statistics, so a refresh costs the same however much
+history is kept.
+"""
+
+####################CONSTANTS###################
+MAX_LAG = 30
+START = datetime.datetime(2011, 1, 1)
+END = datetime.datetime(2012, 12, 1)
+#where the statistics and the appended daily values are kept
+STATE = os.path.join(_data.CACHE_DIR, "daily-online")
+#name, file and column of every daily metric
+METRICS = [("clicks", "clicksPerDay.csv", "count_clicks"),
+	("encounters", "encountersPerDay.csv", "count_encounter")]
+
+
+####################UPDATE###################
+_instrument.step("update")
+if not os.path.isdir(_data.CACHE_DIR):
+	os.makedirs(_data.CACHE_DIR)
+stats = _online.load(STATE)
+if stats is None:
+	history = pd.concat([_data.loadDaily(path, column, START, END) for name, path, column in METRICS],
+		axis=1, keys=[name for name, path, column in METRICS])
+	if os.path.exists(STATE + ".values.bin"):
+		os.remove(STATE + ".values.bin")
+	stats = _online.OnlineStats(history.columns, MAX_LAG, START, history=STATE + ".values.bin")
+	stats.update(history)
+else:
+	paths = sys.argv[1:]
+	if len(paths) != len(METRICS):
+		sys.exit("usage: python updateDaily.py "+" ".join("new"+name.capitalize()+".csv" for name, _, _ in METRICS))
+	new = pd.concat([pd.read_csv(path, index_col=0, parse_dates=True)[column]
+		for (name, _, column), path in zip(METRICS, paths)], axis=1, keys=[name for name, _, _ in METRICS])
+	stats.update(new)
+stats.save(STATE)
+_instrument.rows(stats.n)
+print("Statistics up to "+str(stats.end.date())+" ("+str(stats.n)+" days)")
+
+
+####################REPORT###################
+_instrument.step("ljungBox")
+for name, results in zip(stats.names, stats.ljungBox()):
+	print(name+" ACF Ljung-Box")
+	print(tabulate(results, headers=["lag", "R", "Q", "p-val"]))
+
+_instrument.step("crossCorr")
+print("clicks CCF")
+print(stats.crossCorr("clicks", "encounters"))
+print("encounters CCF")
+print(stats.crossCorr("encounters", "clicks"))
+
+_instrument.step("granger")
+print("\nGranger causality results of clicks onto encounters")
+print(stats.granger("encounters", "clicks"))
+print("\nGranger causality results of encounters onto clicks")
+print(stats.granger("clicks", "encounters"))
+
+_instrument.step("seasonality")
+print("seasonality")
+print(tabulate(stats.seasonality(), headers="keys"))
+_instrument.step(None)